@@ -0,0 +1,90 @@
+"""图片解密性能测试
+
+对比整文件读入的旧实现与内存映射分块异或的 `FileDecoder.decode_file`，
+输出不同文件大小下的耗时及峰值内存（tracemalloc统计的numpy分配）
+
+运行：python benchmarks/bench_image_decode.py
+"""
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ntchat_client.wechat.image_decode import FileDecoder  # noqa: E402
+
+SIZES = (64 << 10, 1 << 20, 8 << 20, 32 << 20, 128 << 20)
+"""测试的文件大小"""
+ROUNDS = 5
+"""每个大小的测试次数，取最快的一次"""
+KEY = 0x5A
+"""测试用密钥"""
+
+
+def legacy_decode(decoder: FileDecoder, image_file: Path, is_thumb: bool) -> Optional[str]:
+    """旧实现：整文件读入，生成同样大小的密钥数组及结果数组"""
+    file_value = np.fromfile(image_file, dtype=np.uint8)
+    file_type = decoder.get_file_type(file_value[0], file_value[1])
+    if file_type is None:
+        return None
+    xor_array = np.full_like(file_value, fill_value=file_type.key)
+    out_value = np.bitwise_xor(file_value, xor_array)
+    out_file = decoder.out_image_dir / f"{image_file.stem}.{file_type.file_type}"
+    with open(out_file, mode="wb") as f:
+        f.write(out_value)
+    return str(out_file.absolute())
+
+
+def make_dat(path: Path, size: int) -> None:
+    """生成加密的jpg文件"""
+    rng = np.random.default_rng(size)
+    data = rng.integers(0, 256, size, dtype=np.uint8)
+    data[0], data[1] = 0xFF, 0xD8
+    np.bitwise_xor(data, np.uint8(KEY), out=data)
+    data.tofile(path)
+
+
+def measure(func: Callable[[], Optional[str]]) -> Tuple[float, int]:
+    """返回 (最快耗时(s), 峰值内存(字节))"""
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        decoder = FileDecoder(str(tmp_path / "out"))
+        print(
+            f"{'size':>10} | {'legacy ms':>10} {'legacy MB':>10} | "
+            f"{'chunked ms':>10} {'chunked MB':>10} | {'speedup':>7}"
+        )
+        for size in SIZES:
+            dat = tmp_path / f"{size}.dat"
+            make_dat(dat, size)
+            legacy_time, legacy_peak = measure(lambda: legacy_decode(decoder, dat, False))
+            legacy_out = (decoder.out_image_dir / f"{dat.stem}.jpg").read_bytes()
+            new_time, new_peak = measure(lambda: decoder.decode_file(dat, False))
+            assert (decoder.out_image_dir / f"{dat.stem}.jpg").read_bytes() == legacy_out
+            print(
+                f"{size >> 10:>8}KB | {legacy_time * 1000:>10.2f} {legacy_peak / 2**20:>10.2f} | "
+                f"{new_time * 1000:>10.2f} {new_peak / 2**20:>10.2f} | "
+                f"{legacy_time / new_time:>6.2f}x"
+            )
+            dat.unlink()
+
+
+if __name__ == "__main__":
+    main()
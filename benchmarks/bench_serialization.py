@@ -0,0 +1,143 @@
+"""序列化微基准
+
+对比旧路径(pydantic 模型 + json)与新路径(slots 模型 + codec)处理
+`get_room_members` 大结果时的耗时，在项目根目录运行：
+
+    python benchmarks/bench_serialization.py
+"""
+import json
+import sys
+import timeit
+from pathlib import Path
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ntchat_client import codec  # noqa: E402
+from ntchat_client.model import HttpResponse, Request, Response  # noqa: E402
+from ntchat_client.model import WsRequest, WsResponse  # noqa: E402
+
+
+class OldRequest(BaseModel):
+    action: str
+    params: Optional[dict]
+
+
+class OldWsRequest(OldRequest):
+    echo: str
+
+
+class OldResponse(BaseModel):
+    status: int
+    msg: str
+    data: Any
+
+
+class OldHttpResponse(OldResponse):
+    ...
+
+
+class OldWsResponse(OldResponse):
+    echo: str
+
+
+def make_members(count: int) -> dict:
+    """构造群成员列表"""
+    return {
+        "member_list": [
+            {
+                "wxid": f"wxid_{i:08d}",
+                "account": f"account_{i}",
+                "nickname": f"群成员昵称{i}",
+                "display_name": f"群名片{i}",
+                "avatar": f"http://wx.qlogo.cn/mmhead/ver_1/{i:032d}/132",
+            }
+            for i in range(count)
+        ]
+    }
+
+
+def old_http(result: Any) -> bytes:
+    request = OldRequest(action="get_room_members", params={"room_wxid": "1@chatroom"})
+    request = OldRequest(action=request.action, params=request.params)
+    response = OldResponse(status=200, msg="调用成功", data=result)
+    response = OldHttpResponse(
+        status=response.status, msg=response.msg, data=response.data
+    )
+    return json.dumps(response.dict(), ensure_ascii=False).encode("utf-8")
+
+
+def new_http(result: Any) -> bytes:
+    Request(action="get_room_members", params={"room_wxid": "1@chatroom"})
+    response = Response(status=200, msg="调用成功", data=result)
+    response = HttpResponse(status=response.status, msg=response.msg, data=response.data)
+    return codec.dumps(response.dict())
+
+
+def old_ws(frame: str, result: Any) -> str:
+    request = OldWsRequest.parse_obj(json.loads(frame))
+    response = OldResponse(status=200, msg="调用成功", data=result)
+    response = OldWsResponse(
+        echo=request.echo, status=response.status, msg=response.msg, data=response.data
+    )
+    return json.dumps(response.dict(), ensure_ascii=False)
+
+
+def new_ws(frame: str, result: Any) -> str:
+    request = WsRequest.parse_obj(codec.loads(frame))
+    response = WsResponse(
+        echo=request.echo, status=200, msg="调用成功", data=result
+    )
+    return codec.dumps(response.dict()).decode("utf-8")
+
+
+def old_event(message: dict) -> None:
+    json.dumps(message, ensure_ascii=False)
+    json.dumps(message, ensure_ascii=False)
+
+
+def new_event(message: dict) -> None:
+    codec.dumps(message)
+
+
+def bench(name: str, func, number: int) -> float:
+    cost = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"{name:<28}{cost * 1e6:>12.1f} us")
+    return cost
+
+
+def main() -> None:
+    frame = json.dumps(
+        {"action": "get_room_members", "params": {"room_wxid": "1@chatroom"}, "echo": "1"}
+    )
+    message = {
+        "type": 11046,
+        "data": {
+            "from_wxid": "wxid_00000001",
+            "room_wxid": "1@chatroom",
+            "msg": "测试消息" * 50,
+            "msgid": "1234567890",
+        },
+    }
+    print(f"codec: {codec.codec.name}")
+    for count in (100, 1000, 5000):
+        result = make_members(count)
+        number = max(1, 2000 // count)
+        print(f"\nget_room_members {count} 人")
+        old = bench("http 旧路径", lambda: old_http(result), number)
+        new = bench("http 新路径", lambda: new_http(result), number)
+        print(f"{'提升':<28}{old / new:>12.2f} x")
+        old = bench("ws 旧路径", lambda: old_ws(frame, result), number)
+        new = bench("ws 新路径", lambda: new_ws(frame, result), number)
+        print(f"{'提升':<28}{old / new:>12.2f} x")
+
+    print("\n事件上报(ws + http_post)")
+    old = bench("旧路径", lambda: old_event(message), 10000)
+    new = bench("新路径", lambda: new_event(message), 10000)
+    print(f"{'提升':<28}{old / new:>12.2f} x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,13 @@
 from functools import partial
 
+from ntchat_client.codec import codec_init
 from ntchat_client.config import Config, Env
 from ntchat_client.driver import Driver
-from ntchat_client.http import post_init, router
-from ntchat_client.log import default_filter, log_init, logger
+from ntchat_client.http import post_init, post_shutdown, router
+from ntchat_client.log import Payload, log_init, logger, set_log_level
 from ntchat_client.scheduler import scheduler_init, scheduler_shutdown
 from ntchat_client.utils import notify
+from ntchat_client.websocket import router as ws_router
 from ntchat_client.websocket import websocket_init, websocket_shutdown
 from ntchat_client.wechat import (
     get_wechat_client,
@@ -24,10 +26,12 @@ def init() -> None:
 
     env = Env()
     config = Config(_common_config=env.dict())
-    default_filter.level = config.log_level
+    set_log_level(config.log_level)
+    Payload.set_max_size(config.log_payload_size)
     log_init(config.log_days)
     logger.info(f"Current <y><b>Env: {env.environment}</b></y>")
     logger.debug(f"Loaded <y><b>Config</b></y>: {str(config.dict())}")
+    codec_init(config.codec)
     # 登录微信
     wechat_init(config)
     wait_for_login()
@@ -37,6 +41,9 @@ def init() -> None:
     # 添加api
     app.include_router(router)
     logger.success("<g>http api已开启...</g>")
+    if config.ws_server:
+        app.include_router(ws_router)
+        logger.success("<g>正向websocket已开启...</g>")
     # 添加事件循环
     _Driver.on_startup(send_event_loop)
     # 添加定时清理任务
@@ -48,6 +55,7 @@ def init() -> None:
     # 添加关闭任务
     _Driver.on_shutdown(scheduler_shutdown)
     _Driver.on_shutdown(websocket_shutdown)
+    _Driver.on_shutdown(post_shutdown)
     _Driver.on_shutdown(wechat_shutdown)
 
     # 启动进程
@@ -0,0 +1,193 @@
+"""序列化模块
+"""
+import json
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple, Type, Union
+
+from .log import logger
+
+
+class Codec:
+    """序列化器基类，所有实现都输出utf-8编码的json"""
+
+    name: str = ""
+    """序列化器名称"""
+
+    @staticmethod
+    def available() -> bool:
+        """依赖是否可用"""
+        return True
+
+    def dumps(self, obj: Any) -> bytes:
+        """序列化为bytes"""
+        raise NotImplementedError
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        """反序列化"""
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    """标准库json"""
+
+    name = "json"
+
+    def __init__(self) -> None:
+        self._encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._encoder.encode(obj).encode("utf-8")
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(Codec):
+    """orjson"""
+
+    name = "orjson"
+
+    @staticmethod
+    def available() -> bool:
+        try:
+            import orjson  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def __init__(self) -> None:
+        import orjson
+
+        self._dumps = orjson.dumps
+        self._loads = orjson.loads
+        self._option = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._dumps(obj, option=self._option)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return self._loads(data)
+
+
+class MsgspecCodec(Codec):
+    """msgspec"""
+
+    name = "msgspec"
+
+    @staticmethod
+    def available() -> bool:
+        try:
+            import msgspec  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def __init__(self) -> None:
+        import msgspec
+
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._encoder.encode(obj)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return self._decoder.decode(data)
+
+
+codecs: Dict[str, Type[Codec]] = {
+    OrjsonCodec.name: OrjsonCodec,
+    MsgspecCodec.name: MsgspecCodec,
+    JsonCodec.name: JsonCodec,
+}
+"""可用序列化器，auto时按顺序选择"""
+
+
+def _select(name: str) -> Codec:
+    """选择序列化器"""
+    if name != "auto":
+        codec_type = codecs.get(name)
+        if codec_type is not None and codec_type.available():
+            return codec_type()
+        logger.warning(f"<m>codec</m> - 序列化器 {name} 不可用，将自动选择...")
+    for codec_type in codecs.values():
+        if codec_type.available():
+            return codec_type()
+    return JsonCodec()
+
+
+codec: Codec = _select("auto")
+"""当前序列化器"""
+
+
+def codec_init(name: str) -> None:
+    """初始化序列化器"""
+    global codec
+    codec = _select(name)
+    logger.debug(f"<m>codec</m> - 使用序列化器：<y>{codec.name}</y>")
+
+
+def dumps(obj: Any) -> bytes:
+    """序列化为json bytes"""
+    return codec.dumps(obj)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """反序列化json"""
+    return codec.loads(data)
+
+
+def iter_ndjson(items: Iterable[Any], chunk_size: int = 65536) -> Iterator[bytes]:
+    """
+    说明:
+        逐项序列化为ndjson，按块输出，不会生成完整的序列化结果
+
+    参数:
+        * `items`：序列化的列表
+        * `chunk_size`：每块的大约字节数
+    """
+    buffer = bytearray()
+    for item in items:
+        buffer += codec.dumps(item)
+        buffer += b"\n"
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def _load_msgpack() -> Optional[Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]]:
+    """加载msgpack实现，优先使用msgpack，其次msgspec，都未安装时返回None"""
+    try:
+        import msgpack
+
+        return partial(msgpack.packb, use_bin_type=True), partial(
+            msgpack.unpackb, raw=False, strict_map_key=False
+        )
+    except ImportError:
+        pass
+    try:
+        import msgspec
+
+        return msgspec.msgpack.encode, msgspec.msgpack.decode
+    except ImportError:
+        return None
+
+
+_msgpack = _load_msgpack()
+
+
+def msgpack_available() -> bool:
+    """msgpack是否可用"""
+    return _msgpack is not None
+
+
+def packb(obj: Any) -> bytes:
+    """序列化为msgpack"""
+    return _msgpack[0](obj)
+
+
+def unpackb(data: bytes) -> Any:
+    """反序列化msgpack"""
+    return _msgpack[1](data)
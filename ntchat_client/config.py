@@ -3,9 +3,9 @@
 import os
 from ipaddress import IPv4Address
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Mapping, Optional, Set, Tuple, Union, Dict
+from typing import TYPE_CHECKING, Any, List, Mapping, Optional, Set, Tuple, Union, Dict
 
-from pydantic import BaseSettings, IPvAnyAddress
+from pydantic import BaseModel, BaseSettings, IPvAnyAddress
 from pydantic.env_settings import (
     EnvSettingsSource,
     InitSettingsSource,
@@ -130,6 +130,48 @@ class Env(BaseConfig):
         env_file = ".env"
 
 
+class HttpPostTarget(BaseModel):
+    """http_post上报目标"""
+
+    name: str = ""
+    """目标名称，用于日志、统计及落盘目录，不填则为target加序号"""
+    url: str
+    """上报地址"""
+    msg_types: Set[int] = set()
+    """只上报的事件类型，为空则不限制"""
+    rooms: Set[str] = set()
+    """只上报的群，为空则不限制，填写后只上报这些群的事件"""
+    concurrency: Optional[int] = None
+    """同时上报数，不填则使用delivery_concurrency"""
+    timeout: float = 5
+    """请求超时时间(s)"""
+    headers: Dict[str, str] = {}
+    """额外的请求头"""
+
+
+class EventRule(BaseModel):
+    """事件规则，所有条件都满足时命中，未填写的条件不限制"""
+
+    name: str = ""
+    """规则名称，用于统计，不填则为rule加序号"""
+    action: str = "drop"
+    """命中后的动作：drop丢弃、accept上报、route只上报到sinks中的上报端"""
+    msg_types: Set[int] = set()
+    """事件类型"""
+    rooms: Set[str] = set()
+    """群id"""
+    senders: Set[str] = set()
+    """发送者wxid"""
+    self_sent: Optional[bool] = None
+    """是否为自身发送的消息"""
+    keywords: List[str] = []
+    """消息内容包含任一关键词"""
+    regex: str = ""
+    """消息内容匹配的正则，与keywords同时填写时满足其一即可"""
+    sinks: Set[str] = set()
+    """route时上报的上报端，如：["ws", "http_post:default"]"""
+
+
 class Config(BaseConfig):
     """主要配置"""
 
@@ -142,18 +184,92 @@ class Config(BaseConfig):
     """http服务端口"""
     http_post_url: str = ""
     """http post上报地址，如果不填则不上报"""
+    http_post_targets: List[HttpPostTarget] = []
+    """多个http post上报目标，可与http_post_url同时使用"""
+    http_post_batch: bool = False
+    """是否批量上报，批量上报时body为事件的json数组"""
+    http_post_linger: float = 0.2
+    """批量上报最长等待时间(s)"""
+    http_post_batch_size: int = 100
+    """批量上报每批最大事件数"""
+    http_post_batch_bytes: int = 1048576
+    """批量上报每批最大字节数"""
+    http_post_spool: bool = False
+    """是否将上报失败的事件保存到磁盘并重试"""
+    http_post_spool_path: str = "./http_post_spool"
+    """上报失败事件保存目录"""
+    http_post_spool_max_bytes: int = 104857600
+    """上报失败事件最大占用空间(字节)"""
+    http_post_spool_policy: str = "drop_oldest"
+    """超出空间时的丢弃策略：drop_oldest丢弃最旧的，drop_newest丢弃新事件"""
+    http_post_retry_base: float = 1
+    """重试初始间隔(s)，每次失败翻倍"""
+    http_post_retry_max: float = 60
+    """重试最大间隔(s)"""
     ws_address: str = ""
     """反向ws连接地址，如果不填则不会连接ws"""
+    ws_buffer_size: int = 0
+    """ws事件缓存条数，开启后事件带有seq字段，重连后补发断开期间的事件，为0(默认)则不缓存，事件格式不变"""
+    ws_reconnect_base: float = 1
+    """ws重连初始间隔(s)，每次重连翻倍，连接保持ws_reconnect_max以上后断开才重新从初始间隔开始"""
+    ws_reconnect_max: float = 60
+    """ws重连最大间隔(s)"""
+    ws_server: bool = False
+    """是否开启正向ws服务，地址为 /ws"""
+    ws_queue_size: int = 1000
+    """每个ws连接的发送队列长度，反向ws及正向ws的每个订阅端各一个"""
+    ws_slow_policy: str = "disconnect"
+    """ws发送队列已满时的策略：disconnect断开连接，drop丢弃事件（有事件缓存时会在队列清空后补发）"""
+    ws_compression: bool = True
+    """ws是否启用permessage-deflate压缩，需要对端支持"""
+    ws_msgpack: bool = False
+    """ws是否协商msgpack二进制帧，需要安装msgpack或msgspec"""
+    ws_max_in_flight: int = 64
+    """ws同时处理的请求数上限"""
+    ws_ordered_actions: Set[str] = set()
+    """需要按接收顺序依次处理的ws接口，如：["send_text"]"""
     access_token: str = ""
     """密钥"""
     log_level: Union[int, str] = "INFO"
     """默认日志等级"""
     log_days: int = 10
     """日志保存天数"""
+    log_payload_size: int = 1000
+    """日志中消息内容的最大长度，为0则不截断"""
     msg_filter: Set[int] = {}
     """事件过滤列表"""
     report_self: bool = False
     """是否上报自身消息"""
+    event_rules: List[EventRule] = []
+    """事件规则，按顺序匹配，第一条命中的规则生效，未命中的事件正常上报"""
+    event_rules_file: str = ""
+    """事件规则json文件，规则排在event_rules之后"""
+    enrich: bool = False
+    """是否在事件中补充群名、发送者昵称及群昵称"""
+    enrich_ttl: float = 600
+    """补充信息缓存刷新间隔(s)"""
+    enrich_size: int = 1000
+    """补充信息最多缓存的群数及联系人数"""
+    dedup: bool = False
+    """是否对事件去重，按消息id，没有消息id时按内容"""
+    dedup_window: float = 300
+    """去重时间窗口(s)"""
+    dedup_size: int = 10000
+    """最多记录的事件数"""
+    dispatch_shards: int = 0
+    """事件处理分片数，同一会话的事件按顺序处理，不同会话并行处理，为0(默认)则在回调线程中处理"""
+    dispatch_queue_size: int = 10000
+    """每个分片的事件队列长度，已满时阻塞回调线程"""
+    delivery_queue_size: int = 10000
+    """每个上报端的事件投递队列长度"""
+    delivery_policy: str = "drop_oldest"
+    """投递队列已满时的策略：block、drop_oldest、drop_low_priority"""
+    delivery_block_timeout: float = 5
+    """block策略最长阻塞时间(s)，超时后丢弃新事件"""
+    delivery_concurrency: int = 8
+    """每个上报端同时上报的事件数，为1时按顺序上报"""
+    delivery_low_priority: Set[int] = set()
+    """低优先级事件类型，drop_low_priority策略下优先丢弃"""
     cache_path: str = "./file_cache"
     """文件缓存目录"""
     cache_days: int = 3
@@ -166,6 +282,52 @@ class Config(BaseConfig):
     """下载pc图片超时时间(s)，超时的图片不会解密"""
     timeout_image_send: bool = False
     """超时的图片消息是否继续发送"""
+    image_workers: int = 2
+    """图片解密线程数"""
+    image_ordering: str = "strict"
+    """图片消息顺序：strict同一会话的消息等待之前的图片消息，best_effort其他消息立即上报"""
+    image_watch: bool = True
+    """是否使用watchdog监听图片下载，未安装watchdog时轮询"""
+    image_poll_interval: float = 0.2
+    """轮询图片下载的间隔(s)，文件大小间隔该时间两次检查不变才认为下载完成"""
+    api_workers: int = 8
+    """api调用线程池大小"""
+    api_timeout: float = 60
+    """api调用超时时间(s)，为0则不超时，发送等非只读接口已发出调用后不再超时，等待调用完成"""
+    api_action_limits: Dict[str, int] = {}
+    """单个api并发上限，如：{"get_room_members": 2}"""
+    api_action_timeouts: Dict[str, float] = {}
+    """单个api超时时间(s)，如：{"send_file": 300}"""
+    query_cache_size: int = 1000
+    """联系人及群查询缓存条数，为0则不缓存"""
+    query_cache_ttl: Dict[str, float] = {
+        "get_contacts": 60,
+        "get_rooms": 60,
+        "get_room_members": 60,
+        "get_contact_detail": 300,
+        "get_room_name": 300,
+    }
+    """各查询接口缓存时间(s)"""
+    api_coalesce: bool = True
+    """是否合并并发的相同只读调用"""
+    directory: bool = False
+    """是否在内存中维护联系人及群目录，用于search_directory"""
+    send_queue: bool = False
+    """是否启用发送队列，启用后send_系列接口按令牌桶限速发送"""
+    send_rate: float = 2
+    """账号每秒发送条数"""
+    send_burst: int = 5
+    """账号突发发送条数"""
+    send_conversation_rate: float = 1
+    """单个会话每秒发送条数"""
+    send_conversation_burst: int = 3
+    """单个会话突发发送条数"""
+    send_queue_size: int = 10000
+    """发送队列最大长度"""
+    send_job_ttl: int = 600
+    """发送任务结果保留时间(s)"""
+    codec: str = "auto"
+    """json序列化器：auto、orjson、msgspec、json"""
 
     class Config:
         extra = "allow"
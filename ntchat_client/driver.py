@@ -101,5 +101,6 @@ class Driver:
             reload_includes=self.fastapi_config.fastapi_reload_includes,
             reload_excludes=self.fastapi_config.fastapi_reload_excludes,
             log_config=LOGGING_CONFIG,
+            ws_per_message_deflate=self.config.ws_compression,
             **kwargs,
         )
@@ -1,2 +1,3 @@
 from .http_api import router as router
 from .http_post import post_init as post_init
+from .http_post import post_shutdown as post_shutdown
@@ -0,0 +1,114 @@
+"""http_post批量上报
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+Sender = Callable[[bytes, int], Awaitable[None]]
+"""发送函数：(json数组, 事件数)"""
+
+
+class PostBatcher:
+    """
+    说明:
+        将事件累积后合并为json数组发送，到达等待时间、条数或字节数上限时发送
+
+        批次按顺序逐个发送
+
+    参数:
+        * `send`：发送函数
+        * `linger`：最长等待时间(s)
+        * `max_size`：每批最大事件数
+        * `max_bytes`：每批最大字节数
+    """
+
+    _items: List[bytes]
+    """当前批次"""
+
+    def __init__(
+        self, send: Sender, linger: float, max_size: int, max_bytes: int
+    ) -> None:
+        self._send = send
+        self._linger = linger
+        self._max_size = max_size
+        self._max_bytes = max_bytes
+        self._items = []
+        self._bytes = 0
+        self._first_time = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._queue: "Optional[asyncio.Queue[Tuple[bytes, int, float]]]" = None
+        self._task: Optional[asyncio.Task] = None
+        self._batches = 0
+        self._events = 0
+        self._sent_bytes = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._size_max = 0
+
+    def add(self, body: bytes) -> None:
+        """添加一个已序列化的事件"""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        if self._items and self._bytes + len(body) + 1 > self._max_bytes:
+            self.flush()
+        if not self._items:
+            self._first_time = time.monotonic()
+            self._timer = asyncio.get_running_loop().call_later(
+                self._linger, self.flush
+            )
+        self._items.append(body)
+        self._bytes += len(body) + 1
+        if len(self._items) >= self._max_size or self._bytes >= self._max_bytes:
+            self.flush()
+
+    def flush(self) -> None:
+        """立即结束当前批次"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._items:
+            return
+        body = b"[" + b",".join(self._items) + b"]"
+        self._queue.put_nowait((body, len(self._items), self._first_time))
+        self._items = []
+        self._bytes = 0
+
+    async def _run(self) -> None:
+        """按顺序发送批次"""
+        while True:
+            body, count, first_time = await self._queue.get()
+            try:
+                await self._send(body, count)
+                latency = time.monotonic() - first_time
+                self._batches += 1
+                self._events += count
+                self._sent_bytes += len(body)
+                self._latency_total += latency
+                self._latency_max = max(self._latency_max, latency)
+                self._size_max = max(self._size_max, count)
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        """批量统计信息"""
+        batches = self._batches or 1
+        return {
+            "batches": self._batches,
+            "events": self._events,
+            "bytes": self._sent_bytes,
+            "pending_events": len(self._items),
+            "pending_batches": self._queue.qsize() if self._queue else 0,
+            "avg_batch_size": self._events / batches,
+            "max_batch_size": self._size_max,
+            "avg_latency_ms": self._latency_total / batches * 1000,
+            "max_latency_ms": self._latency_max * 1000,
+        }
+
+    async def close(self) -> None:
+        """发送剩余事件并关闭"""
+        if self._task is None:
+            return
+        self.flush()
+        await self._queue.join()
+        self._task.cancel()
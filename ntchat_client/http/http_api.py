@@ -1,32 +1,80 @@
 """http_api调用
 """
-from fastapi import APIRouter, Body, Response
-from pydantic.error_wrappers import ValidationError
+from fastapi import APIRouter, Body
+from fastapi.responses import Response, StreamingResponse
 
-from ntchat_client.log import logger
-from ntchat_client.model import HttpRequest, HttpResponse
-from ntchat_client.utils import escape_tag
+from ntchat_client.codec import dumps, iter_ndjson
+from ntchat_client.log import Payload, logger
+from ntchat_client.model import BatchRequest, HttpRequest, HttpResponse
 from ntchat_client.wechat import get_wechat_client
 
 router = APIRouter()
 
 
-@router.post("/{action}", response_model=HttpResponse)
-async def _(action: str, response: Response, params=Body(None)) -> None:
+def _make_headers() -> dict:
+    """响应头"""
+    wechat_client = get_wechat_client()
+    return {
+        "X-self-ID": wechat_client.self_id,
+        "access_token": wechat_client.config.access_token,
+    }
+
+
+def _make_response(res: HttpResponse) -> Response:
+    """直接序列化响应，不经过fastapi的模型校验"""
+    return Response(
+        content=dumps(res.dict()), media_type="application/json", headers=_make_headers()
+    )
+
+
+def _make_stream_response(res: HttpResponse) -> Response:
+    """分页结果以ndjson流式返回，每行一项，分页信息放在响应头"""
+    page: dict = res.data
+    headers = _make_headers()
+    headers["X-Total-Count"] = str(page["total"])
+    if page["next_offset"] is not None:
+        headers["X-Next-Offset"] = str(page["next_offset"])
+    if page["next_cursor"] is not None:
+        headers["X-Next-Cursor"] = page["next_cursor"]
+    return StreamingResponse(
+        iter_ndjson(page["items"]), media_type="application/x-ndjson", headers=headers
+    )
+
+
+@router.post("/batch")
+async def _(params=Body(None)) -> Response:
+    """处理批量api调用"""
+    logger.info("<m>http_api</m> - <g>收到http批量api请求：</g>{}", Payload(params))
+    try:
+        batch = BatchRequest.parse_obj(params)
+    except ValueError:
+        logger.error("<m>http_api</m> - <r>请求参数不正确!</r>")
+        return _make_response(HttpResponse(status=405, msg="请求参数不正确！", data={}))
+    wechat_client = get_wechat_client()
+    res = await wechat_client.handle_http_batch(batch)
+    logger.info("<m>http_api</m> - <g>批量调用返回：</g>{}", Payload(res.dict()))
+
+    return _make_response(res)
+
+
+@router.post("/{action}")
+async def _(action: str, params=Body(None)) -> Response:
     """处理api调用"""
     # 构造请求体
     logger.info(
-        f"<m>http_api</m> - <g>收到http api请求：</g>action：{action}，params：{params}"
+        "<m>http_api</m> - <g>收到http api请求：</g>action：{}，params：{}",
+        action,
+        Payload(params),
     )
-    try:
-        http_request = HttpRequest(action=action, params=params)
-    except ValidationError:
+    if params is not None and not isinstance(params, dict):
         logger.error("<m>http_api</m> - <r>请求参数不正确!</r>")
-        return HttpResponse(status=405, msg="请求参数不正确！", data={})
+        return _make_response(HttpResponse(status=405, msg="请求参数不正确！", data={}))
+    stream = bool(params and params.get("stream"))
+    http_request = HttpRequest(action=action, params=params)
     wechat_client = get_wechat_client()
-    res = wechat_client.handle_http_api(http_request)
-    response.headers["X-self-ID"] = wechat_client.self_id
-    response.headers["access_token"] = wechat_client.config.access_token
-    logger.info(f"<m>http_api</m> - <g>调用返回：</g>{escape_tag(str(res))}")
+    res = await wechat_client.handle_http_api(http_request)
+    logger.info("<m>http_api</m> - <g>调用返回：</g>{}", Payload(res.dict()))
 
-    return res
+    if stream and res.status == 200 and isinstance(res.data, dict):
+        return _make_stream_response(res)
+    return _make_response(res)
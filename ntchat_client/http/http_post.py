@@ -1,55 +1,226 @@
 """http_post上报
 """
+import asyncio
+import random
+from pathlib import Path
+from typing import Dict, List, Optional
+
 from httpx import AsyncClient
 
-from ntchat_client.config import Config
-from ntchat_client.log import logger
+from ntchat_client.config import Config, HttpPostTarget
+from ntchat_client.log import Payload, logger
 from ntchat_client.wechat import get_wechat_client
 
+from .batcher import PostBatcher
+from .spool import PostSpool
+
 post_manager: "PostManager"
 """全局post管理器"""
 
 
-def post_init(config: Config) -> None:
+async def post_init(config: Config) -> None:
     """初始化"""
     global post_manager
     logger.info("正在初始化http_post...")
     wechat_client = get_wechat_client()
     self_id = wechat_client.self_id
     post_manager = PostManager(self_id, config)
-    wechat_client.http_post_handler = post_manager.post_respone
+    for target in post_manager.targets:
+        wechat_client.register_sink(
+            f"http_post:{target.name}",
+            target.post_respone,
+            accept=target.accept,
+            concurrency=target.concurrency,
+        )
+        if target.spool is not None and target.spool.pending:
+            logger.info(
+                f"<m>http_post</m> - {target.name}发现未送达的上报事件，开始重新上报..."
+            )
+            target.start_drain()
+    wechat_client.actions.register_local("get_http_post_stats", post_manager.stats)
     logger.success("<m>http_post</m> - <g>http_post初始化完成...</g>")
 
 
+async def post_shutdown() -> None:
+    """关闭http_post，发送剩余的批量事件"""
+    for target in post_manager.targets:
+        await target.close()
+
+
 class PostManager:
-    """用于处理http_post"""
+    """用于处理http_post，管理所有上报目标"""
+
+    targets: List["PostTarget"]
+    """上报目标"""
+
+    def __init__(self, self_id: str, config: Config) -> None:
+        targets = [
+            target
+            if target.name != ""
+            else target.copy(update={"name": f"target{index}"})
+            for index, target in enumerate(config.http_post_targets)
+        ]
+        if config.http_post_url != "":
+            targets.insert(0, HttpPostTarget(name="default", url=config.http_post_url))
+        self.targets = [
+            PostTarget(self_id, config, target) for target in targets if target.url != ""
+        ]
+
+    def stats(self) -> Dict[str, dict]:
+        """各目标上报统计信息"""
+        return {target.name: target.stats() for target in self.targets}
+
+
+class PostTarget:
+    """
+    说明:
+        单个上报目标，每个目标有独立的客户端、投递队列、批量上报及落盘缓存，互不影响
+
+    参数:
+        * `self_id`：自身id
+        * `config`：配置
+        * `target`：目标配置
+    """
 
     client: AsyncClient
     """客户端"""
     url: str
     """post地址"""
+    batcher: Optional[PostBatcher] = None
+    """批量上报，未启用时为None"""
+    spool: Optional[PostSpool] = None
+    """上报失败落盘缓存，未启用时为None"""
 
-    def __init__(self, self_id: str, config: Config) -> None:
+    def __init__(self, self_id: str, config: Config, target: HttpPostTarget) -> None:
         headers = {
             "X-Self-ID": self_id,
             "access_token": config.access_token,
             "Content-Type": "application/json",
+            **target.headers,
         }
-        self.client = AsyncClient(headers=headers)
-        self.url = config.http_post_url
+        self.name = target.name
+        self.client = AsyncClient(headers=headers, timeout=target.timeout)
+        self.url = target.url
+        self.msg_types = target.msg_types
+        self.rooms = target.rooms
+        self.concurrency = target.concurrency
+        if config.http_post_spool:
+            # 落盘需要按事件顺序写入，只能逐个上报
+            self.concurrency = 1
+        self._post_lock = asyncio.Lock()
+        if config.http_post_batch:
+            self.batcher = PostBatcher(
+                self._post,
+                linger=config.http_post_linger,
+                max_size=config.http_post_batch_size,
+                max_bytes=config.http_post_batch_bytes,
+            )
+        if config.http_post_spool:
+            self.spool = PostSpool(
+                str(Path(config.http_post_spool_path) / self.name),
+                max_bytes=config.http_post_spool_max_bytes,
+                policy=config.http_post_spool_policy,
+            )
+        self.retry_base = config.http_post_retry_base
+        self.retry_max = config.http_post_retry_max
+        self._drain_task: Optional[asyncio.Task] = None
+        self._failed = 0
+
+    def accept(self, msgtype: int, data: dict) -> bool:
+        """事件是否需要上报到此目标"""
+        if self.msg_types and msgtype not in self.msg_types:
+            return False
+        if self.rooms and data.get("room_wxid") not in self.rooms:
+            return False
+        return True
 
-    async def post_respone(self, data: dict) -> None:
+    async def post_respone(self, data: bytes) -> None:
         """
-        上报消息
+        上报消息，消息为已序列化的json
         """
-        if self.url == "":
+        if self.batcher is not None:
+            self.batcher.add(data)
+        else:
+            await self._post(data)
+
+    async def _post(self, data: bytes, count: int = 1) -> None:
+        """上报，启用落盘时失败的内容写入缓存，已有缓存时按顺序排在缓存之后"""
+        if self.spool is None:
+            await self._send(data, count)
             return
+        # 批量上报时可能有多个批次同时上报，串行化保证失败的内容按顺序写入缓存
+        async with self._post_lock:
+            if self.spool.pending or not await self._send(data, count):
+                self.spool.append(data, count)
+                self.start_drain()
 
+    async def _send(self, data: bytes, count: int) -> bool:
+        """发送请求，批量上报时data为json数组，返回是否送达"""
         try:
-            logger.debug(f"<m>http_post</m> - <e>向http_post上报消息：</e>{data}")
-            response = await self.client.post(url=self.url, json=data)
             logger.debug(
-                f"<m>http_post</m> - <e>向http_post上报结果：</e>{response.status_code}"
+                "<m>http_post</m> - <e>向{}上报消息({}条)：</e>{}",
+                self.name,
+                count,
+                Payload(data),
+            )
+            response = await self.client.post(url=self.url, content=data)
+            logger.debug(
+                f"<m>http_post</m> - <e>向{self.name}上报结果：</e>{response.status_code}"
+            )
+        except Exception as e:
+            logger.error(
+                f"<m>http_post</m> - 向{self.name}上报消息出错：<r>{str(e)}</r>"
             )
+            self._failed += 1
+            return False
+        if response.status_code >= 500 or response.status_code == 429:
+            self._failed += 1
+            return False
+        return True
+
+    def start_drain(self) -> None:
+        """开始重新上报缓存"""
+        if self._drain_task is None:
+            self._drain_task = asyncio.create_task(self._drain())
+
+    async def _drain(self) -> None:
+        """按顺序重新上报缓存，失败时指数退避并加入随机抖动"""
+        attempt = 0
+        try:
+            while True:
+                record = self.spool.peek()
+                if record is None:
+                    break
+                if await self._send(*record):
+                    self.spool.commit()
+                    attempt = 0
+                    continue
+                delay = min(self.retry_max, self.retry_base * 2**attempt)
+                attempt += 1
+                await asyncio.sleep(random.uniform(delay / 2, delay))
         except Exception as e:
-            logger.error(f"<m>http_post</m> - http_post上报消息出错：<r>{str(e)}</r>")
+            logger.error(f"<m>http_post</m> - 重新上报{self.name}缓存出错：<r>{str(e)}</r>")
+            return
+        finally:
+            # 出错后下次上报失败时可以重新开始
+            self._drain_task = None
+        logger.success(f"<m>http_post</m> - <g>{self.name}缓存的上报事件已全部送达...</g>")
+
+    def stats(self) -> dict:
+        """上报统计信息"""
+        return {
+            "url": self.url,
+            "failed_requests": self._failed,
+            "batch": self.batcher.stats() if self.batcher is not None else None,
+            "spool": self.spool.stats() if self.spool is not None else None,
+        }
+
+    async def close(self) -> None:
+        """发送剩余的批量事件并关闭"""
+        if self.batcher is not None:
+            await self.batcher.close()
+        if self._drain_task is not None:
+            self._drain_task.cancel()
+        if self.spool is not None:
+            self.spool.close()
+        await self.client.aclose()
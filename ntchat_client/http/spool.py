@@ -0,0 +1,215 @@
+"""http_post上报失败落盘
+"""
+import os
+from collections import deque
+from pathlib import Path
+from typing import BinaryIO, Deque, Optional, Tuple
+
+from ntchat_client.codec import loads
+from ntchat_client.log import logger
+
+SPOOL_POLICIES = ("drop_oldest", "drop_newest")
+"""超出容量时的丢弃策略"""
+
+
+class PostSpool:
+    """
+    说明:
+        追加写的磁盘队列，按顺序保存未送达的上报内容，进程重启后继续读取
+
+        数据按段文件保存，每行一条记录：`事件数 json`，读取位置保存在 `cursor` 文件中
+
+        进程在写入中途退出可能留下损坏的记录，读取时校验并跳过，不会阻塞之后的记录
+
+    参数:
+        * `path`：保存目录
+        * `max_bytes`：最大占用字节数
+        * `policy`：超出容量时的丢弃策略，`drop_oldest` 或 `drop_newest`
+        * `segment_bytes`：单个段文件大小
+    """
+
+    _segments: Deque[Path]
+    """段文件，从旧到新"""
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int,
+        policy: str,
+        segment_bytes: int = 4 * 1024 * 1024,
+    ) -> None:
+        if policy not in SPOOL_POLICIES:
+            raise ValueError(f"http_post_spool_policy应为：{'、'.join(SPOOL_POLICIES)}")
+        self._path = Path(path)
+        self._path.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._policy = policy
+        self._segment_bytes = segment_bytes
+        self._cursor_file = self._path / "cursor"
+        self._segments = deque(sorted(self._path.glob("*.spool")))
+        self._seq = int(self._segments[-1].stem) + 1 if self._segments else 1
+        self._offset = 0
+        self._next_offset = 0
+        self._reader: Optional[BinaryIO] = None
+        self._writer: Optional[BinaryIO] = None
+        self._dropped = 0
+        self._appended = 0
+        self._committed = 0
+        self._corrupted = 0
+        self._load_cursor()
+        self._bytes = sum(one.stat().st_size for one in self._segments) - self._offset
+
+    def _load_cursor(self) -> None:
+        """读取上次的读取位置"""
+        if not self._cursor_file.exists() or not self._segments:
+            return
+        try:
+            name, offset = self._cursor_file.read_text().split()
+            offset = int(offset)
+        except ValueError:
+            return
+        while self._segments and self._segments[0].name < name:
+            self._segments.popleft().unlink()
+        if self._segments and self._segments[0].name == name:
+            self._offset = offset
+
+    def _save_cursor(self) -> None:
+        """保存读取位置"""
+        if not self._segments:
+            if self._cursor_file.exists():
+                self._cursor_file.unlink()
+            return
+        tmp = self._cursor_file.with_suffix(".tmp")
+        tmp.write_text(f"{self._segments[0].name} {self._offset}")
+        os.replace(tmp, self._cursor_file)
+
+    @property
+    def pending(self) -> bool:
+        """是否有未送达的记录"""
+        return self._bytes > 0
+
+    def _new_segment(self) -> None:
+        """新建段文件"""
+        if self._writer is not None:
+            self._writer.close()
+        segment = self._path / f"{self._seq:012d}.spool"
+        self._seq += 1
+        self._segments.append(segment)
+        self._writer = open(segment, mode="ab")
+
+    def _drop_oldest_segment(self) -> None:
+        """删除最旧的段文件"""
+        segment = self._segments.popleft()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        data = segment.read_bytes()[self._offset :]
+        self._dropped += data.count(b"\n")
+        self._bytes -= len(data)
+        segment.unlink()
+        self._offset = self._next_offset = 0
+        self._save_cursor()
+
+    def append(self, body: bytes, count: int) -> bool:
+        """追加记录，因容量丢弃时返回False"""
+        record = b"%d " % count + body + b"\n"
+        if self._bytes + len(record) > self._max_bytes:
+            if self._policy == "drop_oldest":
+                while (
+                    len(self._segments) > 1
+                    and self._bytes + len(record) > self._max_bytes
+                ):
+                    self._drop_oldest_segment()
+            if self._bytes + len(record) > self._max_bytes:
+                self._dropped += 1
+                logger.error("<m>http_post</m> - <r>上报缓存已满，丢弃事件...</r>")
+                return False
+        if (
+            self._writer is None
+            or self._writer.tell() + len(record) > self._segment_bytes
+        ):
+            self._new_segment()
+        self._writer.write(record)
+        self._writer.flush()
+        self._bytes += len(record)
+        self._appended += 1
+        return True
+
+    def peek(self) -> Optional[Tuple[bytes, int]]:
+        """读取最旧的记录，返回 (内容, 事件数)，没有记录返回None"""
+        while self._segments:
+            if self._reader is None:
+                self._reader = open(self._segments[0], mode="rb")
+            self._reader.seek(self._offset)
+            line = self._reader.readline()
+            if line.endswith(b"\n"):
+                record = self._parse(line)
+                if record is not None:
+                    self._next_offset = self._offset + len(line)
+                    return record
+                # 损坏的记录直接跳过
+                self._corrupted += 1
+                logger.warning("<m>http_post</m> - 上报缓存中有损坏的记录，已跳过...")
+                self._bytes -= len(line)
+                self._offset += len(line)
+                self._next_offset = self._offset
+                self._save_cursor()
+                continue
+            if len(self._segments) == 1:
+                return None
+            # 当前段已读完，末尾不完整的记录直接丢弃
+            self._bytes -= len(line)
+            self._reader.close()
+            self._reader = None
+            self._segments.popleft().unlink()
+            self._offset = 0
+            self._save_cursor()
+        return None
+
+    @staticmethod
+    def _parse(line: bytes) -> Optional[Tuple[bytes, int]]:
+        """解析一行记录，记录损坏时返回None"""
+        count, _, body = line[:-1].partition(b" ")
+        if not count.isdigit() or not body:
+            return None
+        try:
+            loads(body)
+        except Exception:
+            return None
+        return body, int(count)
+
+    def commit(self) -> None:
+        """确认已送达peek读取的记录"""
+        self._bytes -= self._next_offset - self._offset
+        self._offset = self._next_offset
+        self._committed += 1
+        if self._bytes == 0:
+            # 全部送达，清理文件
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            while self._segments:
+                self._segments.popleft().unlink()
+            self._offset = self._next_offset = 0
+        self._save_cursor()
+
+    def stats(self) -> dict:
+        """缓存统计信息"""
+        return {
+            "bytes": self._bytes,
+            "segments": len(self._segments),
+            "appended_records": self._appended,
+            "committed_records": self._committed,
+            "dropped_records": self._dropped,
+            "corrupted_records": self._corrupted,
+        }
+
+    def close(self) -> None:
+        """关闭文件"""
+        if self._reader is not None:
+            self._reader.close()
+        if self._writer is not None:
+            self._writer.close()
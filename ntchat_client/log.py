@@ -1,9 +1,10 @@
 """日志模块
 """
 import logging
+import reprlib
 import sys
 from pathlib import Path
-from typing import Union
+from typing import Any, Union
 
 from loguru._logger import Core, Logger
 
@@ -25,16 +26,71 @@ logger = Logger(
 class Filter:
     """过滤器类"""
 
+    levelno: int
+    """预先计算的日志等级数值"""
+
     def __init__(self) -> None:
-        self.level: Union[int, str] = "INFO"
+        self.level = "INFO"
+
+    @property
+    def level(self) -> Union[int, str]:
+        """日志等级"""
+        return self._level
+
+    @level.setter
+    def level(self, level: Union[int, str]) -> None:
+        self._level = level
+        self.levelno = logger.level(level).no if isinstance(level, str) else level
 
     def __call__(self, record):
         module_name: str = record["name"]
         record["name"] = module_name.split(".")[0]
-        levelno = (
-            logger.level(self.level).no if isinstance(self.level, str) else self.level
-        )
-        return record["level"].no >= levelno
+        return record["level"].no >= self.levelno
+
+
+class Payload:
+    """
+    说明:
+        日志中的消息内容，只有在日志真正输出时才会渲染，并截断到 `max_size` 长度
+
+    用法:
+        `logger.debug("收到消息：{}", Payload(message))`
+    """
+
+    __slots__ = ("obj",)
+
+    max_size: int = 1000
+    """最大长度，为0则不截断"""
+    _repr = reprlib.Repr()
+
+    def __init__(self, obj: Any) -> None:
+        self.obj = obj
+
+    @classmethod
+    def set_max_size(cls, max_size: int) -> None:
+        """设置最大长度"""
+        cls.max_size = max_size
+        if max_size > 0:
+            cls._repr.maxstring = max_size
+            cls._repr.maxother = max_size
+            cls._repr.maxlong = max_size
+            cls._repr.maxlist = cls._repr.maxtuple = cls._repr.maxdict = max(
+                max_size // 20, 6
+            )
+            cls._repr.maxset = cls._repr.maxfrozenset = cls._repr.maxlist
+            cls._repr.maxlevel = 8
+
+    def __str__(self) -> str:
+        obj = self.obj
+        size = self.max_size
+        if isinstance(obj, (bytes, bytearray)):
+            obj = bytes(obj[: size or None]).decode("utf-8", errors="ignore")
+        if size <= 0:
+            return str(obj)
+        text = obj if isinstance(obj, str) else self._repr.repr(obj)
+        if len(text) > size:
+            text = text[:size] + "..."
+        return text
 
 
 default_format: str = (
@@ -65,6 +121,7 @@ class LoguruHandler(logging.Handler):  # pragma: no cover
 
 
 default_filter = Filter()
+Payload.set_max_size(Payload.max_size)
 logger_id = logger.add(
     sys.stdout,
     level=0,
@@ -74,6 +131,20 @@ logger_id = logger.add(
 )
 
 
+def set_log_level(level: Union[int, str]) -> None:
+    """设置日志等级，输出端使用相同等级，低于等级的日志在格式化前即被丢弃"""
+    global logger_id
+    default_filter.level = level
+    logger.remove(logger_id)
+    logger_id = logger.add(
+        sys.stdout,
+        level=default_filter.levelno,
+        diagnose=False,
+        filter=default_filter,
+        format=default_format,
+    )
+
+
 def log_init(log_days: int) -> None:
     """日志初始化"""
     Path("./logs/info").mkdir(parents=True, exist_ok=True)
@@ -102,7 +173,7 @@ def log_init(log_days: int) -> None:
         info_path + "{time:YYYY-MM-DD}.log",
         rotation="00:00",
         retention=f"{log_days} days",
-        level="INFO",
+        level=max(logger.level("INFO").no, default_filter.levelno),
         format=file_format,
         filter=default_filter,
         encoding="utf-8",
@@ -114,7 +185,7 @@ def log_init(log_days: int) -> None:
         debug_path + "{time:YYYY-MM-DD}.log",
         rotation="00:00",
         retention=f"{log_days} days",
-        level="DEBUG",
+        level=max(logger.level("DEBUG").no, default_filter.levelno),
         format=file_format,
         filter=default_filter,
         encoding="utf-8",
@@ -126,7 +197,7 @@ def log_init(log_days: int) -> None:
         error_path + "{time:YYYY-MM-DD}.log",
         rotation="00:00",
         retention=f"{log_days} days",
-        level="ERROR",
+        level=max(logger.level("ERROR").no, default_filter.levelno),
         format=error_format,
         filter=default_filter,
         encoding="utf-8",
@@ -1,33 +1,120 @@
-from typing import Any, Optional
+"""api数据模型
 
-from pydantic import BaseModel
+使用 `__slots__` 轻量类，数据直接透传，不做拷贝与模型校验
+"""
+from typing import Any, List, Optional
 
 
-class Request(BaseModel):
+class Request:
     """api 请求基类"""
 
+    __slots__ = ("action", "params")
+
     action: str
     """请求方法"""
     params: Optional[dict]
     """请求参数"""
 
+    def __init__(self, action: str, params: Optional[dict] = None) -> None:
+        self.action = action
+        self.params = params
+
+    @classmethod
+    def parse_obj(cls, obj: Any) -> "Request":
+        """从dict构造，参数不正确时抛出 `ValueError`"""
+        if not isinstance(obj, dict):
+            raise ValueError("请求体应为dict")
+        action = obj.get("action")
+        params = obj.get("params")
+        if not isinstance(action, str):
+            raise ValueError("action应为str")
+        if params is not None and not isinstance(params, dict):
+            raise ValueError("params应为dict")
+        return cls(action, params)
+
+    def __repr__(self) -> str:
+        return f"action={self.action!r} params={self.params!r}"
+
 
 class HttpRequest(Request):
     """请求体参数"""
 
-    ...
+    __slots__ = ()
 
 
 class WsRequest(Request):
     """websocket api 请求"""
 
+    __slots__ = ("echo",)
+
     echo: str
     """echo值"""
 
-
-class Response(BaseModel):
+    def __init__(self, action: str, params: Optional[dict] = None, echo: str = "") -> None:
+        super().__init__(action, params)
+        self.echo = echo
+
+    @classmethod
+    def parse_obj(cls, obj: Any) -> "WsRequest":
+        request = super().parse_obj(obj)
+        echo = cls.parse_echo(obj)
+        if echo is None:
+            raise ValueError("echo应为str")
+        request.echo = echo
+        return request
+
+    @staticmethod
+    def parse_echo(obj: Any) -> Optional[str]:
+        """获取echo值，数字转换为str，与原pydantic模型一致，无法获取时返回None"""
+        if not isinstance(obj, dict):
+            return None
+        echo = obj.get("echo")
+        if isinstance(echo, str):
+            return echo
+        if isinstance(echo, (int, float)):
+            return str(echo)
+        return None
+
+
+class BatchRequest:
+    """批量调用请求"""
+
+    __slots__ = ("items", "parallel", "stop_on_error")
+
+    items: List[Request]
+    """按顺序执行的调用列表"""
+    parallel: bool
+    """是否并行执行相邻的只读调用"""
+    stop_on_error: bool
+    """出错后是否停止执行后续调用"""
+
+    def __init__(
+        self, items: List[Request], parallel: bool = False, stop_on_error: bool = False
+    ) -> None:
+        self.items = items
+        self.parallel = parallel
+        self.stop_on_error = stop_on_error
+
+    @classmethod
+    def parse_obj(cls, obj: Any) -> "BatchRequest":
+        """从dict构造，参数不正确时抛出 `ValueError`"""
+        if not isinstance(obj, dict):
+            raise ValueError("请求体应为dict")
+        items = obj.get("items")
+        if not isinstance(items, list):
+            raise ValueError("items应为list")
+        return cls(
+            [Request.parse_obj(item) for item in items],
+            bool(obj.get("parallel", False)),
+            bool(obj.get("stop_on_error", False)),
+        )
+
+
+class Response:
     """api 响应基类"""
 
+    __slots__ = ("status", "msg", "data")
+
     status: int
     """状态值"""
     msg: str
@@ -35,15 +122,41 @@ class Response(BaseModel):
     data: Any
     """返回数据"""
 
+    def __init__(self, status: int, msg: str, data: Any) -> None:
+        self.status = status
+        self.msg = msg
+        self.data = data
+
+    def dict(self) -> dict:
+        """转换为dict，data不做拷贝"""
+        return {"status": self.status, "msg": self.msg, "data": self.data}
+
+    def __repr__(self) -> str:
+        return f"status={self.status} msg={self.msg!r} data={self.data!r}"
+
 
 class HttpResponse(Response):
     """http api 响应"""
 
-    ...
+    __slots__ = ()
 
 
 class WsResponse(Response):
     """websocket api 响应"""
 
+    __slots__ = ("echo",)
+
     echo: str
     """echo值"""
+
+    def __init__(self, status: int, msg: str, data: Any, echo: str = "") -> None:
+        super().__init__(status, msg, data)
+        self.echo = echo
+
+    def dict(self) -> dict:
+        return {
+            "status": self.status,
+            "msg": self.msg,
+            "data": self.data,
+            "echo": self.echo,
+        }
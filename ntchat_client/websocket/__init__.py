@@ -1,2 +1,3 @@
+from .server import router as router
 from .websocket import websocket_init as websocket_init
 from .websocket import websocket_shutdown as websocket_shutdown
@@ -0,0 +1,112 @@
+"""
+ws事件缓存
+"""
+from collections import deque
+from itertools import islice
+from typing import Awaitable, Callable, Deque, List, Tuple
+
+from ntchat_client.model import WsRequest, WsResponse
+
+EVENT_ACTIONS = ("ack_event", "resume_event")
+"""事件确认及补发接口，由ws连接本地处理"""
+
+
+class EventBuffer:
+    """
+    说明:
+        为事件编号并保存最近的事件，用于重连后补发
+
+        序号从1开始递增，只有开启缓存时才写入事件的 `seq` 字段，未开启时事件格式不变
+
+    参数:
+        * `max_size`：最多保存的事件数
+    """
+
+    _events: Deque[Tuple[int, bytes]]
+    """最近的事件：(序号, 事件)"""
+
+    def __init__(self, max_size: int) -> None:
+        self._events = deque(maxlen=max_size)
+        self._seq = 0
+
+    @property
+    def enabled(self) -> bool:
+        """是否缓存事件"""
+        return bool(self._events.maxlen)
+
+    @property
+    def seq(self) -> int:
+        """最新的序号"""
+        return self._seq
+
+    @property
+    def first_seq(self) -> int:
+        """缓存中最旧的序号，没有缓存时为下一个序号"""
+        if self._events:
+            return self._events[0][0]
+        return self._seq + 1
+
+    def append(self, body: bytes) -> Tuple[int, bytes]:
+        """
+        说明:
+            为已序列化的事件编号并保存，不会重新序列化
+
+        返回:
+            * `int`：序号
+            * `bytes`：开启缓存时为带序号的事件，否则为原事件
+        """
+        self._seq += 1
+        if self.enabled:
+            # 事件为非空json对象，直接在开头插入序号字段
+            body = b'{"seq":%d,' % self._seq + body[1:]
+            self._events.append((self._seq, body))
+        return self._seq, body
+
+    def since(self, seq: int) -> List[Tuple[int, bytes]]:
+        """获取序号大于seq的缓存事件"""
+        if seq >= self._seq:
+            return []
+        start = max(0, seq + 1 - self.first_seq)
+        return list(islice(self._events, start, None))
+
+    def stats(self) -> dict:
+        """缓存统计信息"""
+        return {
+            "seq": self._seq,
+            "first_seq": self.first_seq,
+            "buffered": len(self._events),
+        }
+
+
+async def handle_event_request(
+    request: WsRequest,
+    buffer: EventBuffer,
+    replay: Callable[[int], Awaitable[int]],
+    ack: Callable[[int], None],
+) -> WsResponse:
+    """
+    说明:
+        处理事件确认及补发请求
+
+    参数:
+        * `request`：ws请求，`action` 为 `ack_event` 或 `resume_event`
+        * `buffer`：事件缓存
+        * `replay`：补发函数，参数为序号，返回补发数量
+        * `ack`：确认函数，参数为序号
+    """
+    echo = request.echo
+    if not buffer.enabled:
+        return WsResponse(echo=echo, status=405, msg="未开启事件缓存：ws_buffer_size为0", data={})
+    try:
+        seq = int((request.params or {})["seq"])
+    except (KeyError, TypeError, ValueError):
+        return WsResponse(echo=echo, status=405, msg="请求参数不正确：需要seq", data={})
+    if request.action == "ack_event":
+        ack(seq)
+        return WsResponse(echo=echo, status=200, msg="调用成功", data={})
+    first_seq = buffer.first_seq
+    count = await replay(seq)
+    data = {"replayed": count, "first_seq": first_seq, "seq": buffer.seq}
+    if seq + 1 < first_seq:
+        return WsResponse(echo=echo, status=206, msg="部分事件已超出缓存", data=data)
+    return WsResponse(echo=echo, status=200, msg="调用成功", data=data)
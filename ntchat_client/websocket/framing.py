@@ -0,0 +1,92 @@
+"""
+ws消息帧编码
+"""
+from typing import Any, Iterable, NamedTuple, Optional, Union
+
+from ntchat_client.codec import loads, msgpack_available, packb, unpackb
+
+SUBPROTOCOL_MSGPACK = "ntchat.msgpack"
+"""msgpack二进制帧子协议"""
+SUBPROTOCOL_JSON = "ntchat.json"
+"""json文本帧子协议"""
+
+
+class Frame(NamedTuple):
+    """待发送的ws帧"""
+
+    data: Union[str, bytes]
+    """帧数据，文本帧为str，二进制帧为bytes"""
+    size: int
+    """字节数"""
+
+
+def offer_subprotocols(use_msgpack: bool) -> Optional[list]:
+    """作为客户端时提供的子协议，未启用msgpack时不协商"""
+    if use_msgpack and msgpack_available():
+        return [SUBPROTOCOL_MSGPACK, SUBPROTOCOL_JSON]
+    return None
+
+
+def select_subprotocol(offered: Iterable[str], use_msgpack: bool) -> Optional[str]:
+    """作为服务端时从对端提供的子协议中选择"""
+    offered = list(offered)
+    if use_msgpack and msgpack_available() and SUBPROTOCOL_MSGPACK in offered:
+        return SUBPROTOCOL_MSGPACK
+    if SUBPROTOCOL_JSON in offered:
+        return SUBPROTOCOL_JSON
+    return None
+
+
+class Framing:
+    """
+    说明:
+        单个ws连接的帧编码，协商为 `ntchat.msgpack` 时使用msgpack二进制帧，否则使用json文本帧
+
+        内部消息均为已序列化的json，发送时按需转换，同时统计帧数及字节数（压缩前）
+
+    参数:
+        * `subprotocol`：协商的子协议
+    """
+
+    def __init__(self, subprotocol: Optional[str] = None) -> None:
+        self.negotiate(subprotocol)
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.frames_received = 0
+        self.bytes_received = 0
+
+    def negotiate(self, subprotocol: Optional[str]) -> None:
+        """设置协商的子协议，重连时统计不会清零"""
+        self.subprotocol = subprotocol
+        self.binary = subprotocol == SUBPROTOCOL_MSGPACK
+
+    def encode(self, body: bytes) -> Frame:
+        """将已序列化的json编码为帧"""
+        if self.binary:
+            data = packb(loads(body))
+            return Frame(data, len(data))
+        return Frame(body.decode("utf-8"), len(body))
+
+    def decode(self, data: Union[str, bytes]) -> Any:
+        """解码收到的帧数据"""
+        self.frames_received += 1
+        if isinstance(data, bytes):
+            self.bytes_received += len(data)
+            return unpackb(data) if self.binary else loads(data)
+        self.bytes_received += len(data.encode("utf-8"))
+        return loads(data)
+
+    def sent(self, frame: Frame) -> None:
+        """记录已发送的帧"""
+        self.frames_sent += 1
+        self.bytes_sent += frame.size
+
+    def stats(self) -> dict:
+        """帧统计信息"""
+        return {
+            "subprotocol": self.subprotocol,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "frames_received": self.frames_received,
+            "bytes_received": self.bytes_received,
+        }
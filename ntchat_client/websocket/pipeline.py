@@ -0,0 +1,112 @@
+"""
+ws请求并发处理
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from ntchat_client.codec import dumps
+from ntchat_client.log import logger
+from ntchat_client.model import WsRequest, WsResponse
+
+RequestHandler = Callable[[WsRequest], Awaitable[WsResponse]]
+"""请求处理函数"""
+ResponseSender = Callable[[bytes], Awaitable[None]]
+"""响应发送函数，参数为已序列化的json"""
+
+
+class RequestPipeline:
+    """
+    说明:
+        ws请求并发处理，每个请求在独立的task中处理，完成后立即发送响应，调用方通过 `echo` 对应请求
+
+        同时处理的请求达到上限时 `submit` 会等待，接收循环随之暂停，不会无限堆积
+
+    参数:
+        * `handler`：请求处理函数
+        * `send`：响应发送函数
+        * `max_in_flight`：同时处理的请求数上限
+        * `ordered_actions`：需要按接收顺序依次处理的接口，同一接口的请求不会并发
+    """
+
+    _tasks: Set["asyncio.Task[None]"]
+    """处理中的请求"""
+    _tails: Dict[str, "asyncio.Task[None]"]
+    """有序接口最后一个请求"""
+
+    def __init__(
+        self,
+        handler: RequestHandler,
+        send: ResponseSender,
+        max_in_flight: int,
+        ordered_actions: Iterable[str] = (),
+    ) -> None:
+        self._handler = handler
+        self._send = send
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._ordered_actions = set(ordered_actions)
+        self._tasks = set()
+        self._tails = {}
+        self._handled = 0
+        self._max_in_flight = 0
+
+    async def submit(self, request: WsRequest) -> None:
+        """提交请求，达到并发上限时等待"""
+        await self._semaphore.acquire()
+        previous = None
+        ordered = request.action in self._ordered_actions
+        if ordered:
+            previous = self._tails.get(request.action)
+        task = asyncio.create_task(self._handle(request, previous))
+        self._tasks.add(task)
+        self._max_in_flight = max(self._max_in_flight, len(self._tasks))
+        if ordered:
+            self._tails[request.action] = task
+        task.add_done_callback(lambda done: self._done(request.action, done))
+
+    async def reject(self, data: Any, error: str) -> None:
+        """
+        说明:
+            无法解析的请求直接返回405，调用方不会一直等待响应
+
+        参数:
+            * `data`：解码后的请求，无法解码时为None，用于获取echo
+            * `error`：错误信息
+        """
+        response = WsResponse(
+            echo=WsRequest.parse_echo(data) or "",
+            status=405,
+            msg=f"请求参数不正确：{error}",
+            data={},
+        )
+        await self._send(dumps(response.dict()))
+
+    async def _handle(
+        self, request: WsRequest, previous: "Optional[asyncio.Task[None]]"
+    ) -> None:
+        """处理请求并发送响应"""
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            response = await self._handler(request)
+        except Exception as e:
+            logger.error(f"<m>websocket</m> - 处理ws请求出错：<r>{str(e)}</r>")
+            response = WsResponse(
+                echo=request.echo, status=500, msg=f"处理请求出错：{str(e)}", data={}
+            )
+        await self._send(dumps(response.dict()))
+
+    def _done(self, action: str, task: "asyncio.Task[None]") -> None:
+        """请求处理结束"""
+        self._tasks.discard(task)
+        if self._tails.get(action) is task:
+            del self._tails[action]
+        self._handled += 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        """请求处理统计信息"""
+        return {
+            "in_flight": len(self._tasks),
+            "max_in_flight": self._max_in_flight,
+            "handled": self._handled,
+        }
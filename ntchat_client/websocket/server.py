@@ -0,0 +1,236 @@
+"""正向websocket服务
+"""
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Set
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from ntchat_client.config import Config
+from ntchat_client.log import Payload, logger
+from ntchat_client.model import WsRequest, WsResponse
+
+from .buffer import EVENT_ACTIONS, EventBuffer, handle_event_request
+from .framing import Frame, Framing, select_subprotocol
+from .pipeline import RequestPipeline
+from .writer import WsWriter
+
+router = APIRouter()
+
+ws_server: Optional["WsServer"] = None
+"""全局正向ws服务，未启用时为None"""
+
+
+def ws_server_init(
+    config: Config, message_handler: Callable[..., Awaitable[WsResponse]]
+) -> "WsServer":
+    """初始化正向ws服务"""
+    global ws_server
+    ws_server = WsServer(config, message_handler)
+    return ws_server
+
+
+@router.websocket("/ws")
+async def _(websocket: WebSocket) -> None:
+    """正向ws连接"""
+    if ws_server is None:
+        await websocket.close(code=1008)
+        return
+    await ws_server.handle(websocket)
+
+
+class Subscriber:
+    """
+    说明:
+        正向ws订阅端，事件及响应放入独立的发送队列，由发送任务按顺序发送
+
+        事件按序号放入队列，补发期间的新事件等待队列清空后从缓存按顺序补发，不会与补发的事件交错
+
+    参数:
+        * `server`：所属服务
+        * `websocket`：ws连接
+        * `framing`：帧编码
+    """
+
+    def __init__(
+        self, server: "WsServer", websocket: WebSocket, framing: Framing
+    ) -> None:
+        self.server = server
+        self.websocket = websocket
+        self.framing = framing
+        self.writer = WsWriter(self._write, server.queue_size, on_idle=self._refill)
+        self.pipeline = RequestPipeline(
+            self._handle_request,
+            self.send_response,
+            max_in_flight=server.max_in_flight,
+            ordered_actions=server.ordered_actions,
+        )
+        self._queued_seq = server.buffer.seq
+        """已放入发送队列的最新事件序号，连接前的事件只在请求补发时发送"""
+        self._slow = False
+        self._dropped = 0
+
+    def push(self, frame: Frame, seq: int) -> None:
+        """放入已编码的事件，队列已满时按策略丢弃或断开"""
+        if self._slow:
+            return
+        buffer = self.server.buffer
+        if buffer.enabled and seq != self._queued_seq + 1:
+            # 之前的事件还未放入发送队列，等待队列清空后按顺序补发
+            return
+        if self.writer.push(frame, seq):
+            self._queued_seq = seq
+            return
+        if self.server.slow_policy == "disconnect":
+            self._dropped += 1
+            self._slow = True
+            self.server.slow_disconnects += 1
+            asyncio.create_task(self.websocket.close(code=1013))
+        elif not buffer.enabled:
+            self._dropped += 1
+
+    async def replay(self, seq: int) -> int:
+        """补发序号大于seq的缓存事件，返回补发数量"""
+        count = len(self.server.buffer.since(seq))
+        self._queued_seq = min(self._queued_seq, seq)
+        self._refill()
+        return count
+
+    def _refill(self) -> None:
+        """将未放入发送队列的缓存事件按顺序放入，直到队列已满"""
+        buffer = self.server.buffer
+        if self._slow or self._queued_seq >= buffer.seq:
+            return
+        for seq, body in buffer.since(self._queued_seq):
+            if not self.writer.push(self.framing.encode(body), seq):
+                break
+            self._queued_seq = seq
+
+    async def send_response(self, body: bytes) -> None:
+        """发送响应，响应为已序列化的json，队列已满时等待"""
+        await self.writer.put(self.framing.encode(body))
+
+    async def _handle_request(self, request: WsRequest) -> WsResponse:
+        """处理ws请求，事件确认及补发在本地处理"""
+        if request.action in EVENT_ACTIONS:
+            return await handle_event_request(
+                request, self.server.buffer, self.replay, lambda _: None
+            )
+        return await self.server.message_handler(request)
+
+    async def _write(self, frames: List[Frame]) -> None:
+        """按顺序写入多个帧"""
+        for frame in frames:
+            logger.debug("<m>ws_server</m> - <e>向订阅端发送消息：</e>{}", Payload(frame.data))
+            if isinstance(frame.data, bytes):
+                await self.websocket.send_bytes(frame.data)
+            else:
+                await self.websocket.send_text(frame.data)
+            self.framing.sent(frame)
+
+    async def run(self) -> None:
+        """接收请求直到连接断开"""
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000))
+                msg = message.get("text")
+                if msg is None:
+                    msg = message.get("bytes")
+                logger.success("<m>ws_server</m> - <g>收到ws消息：</g>{}", Payload(msg))
+                data = None
+                try:
+                    data = self.framing.decode(msg)
+                    request = WsRequest.parse_obj(data)
+                except Exception as e:
+                    logger.error(f"<m>ws_server</m> - <r>请求参数不正确：{str(e)}</r>")
+                    await self.pipeline.reject(data, str(e))
+                    continue
+                await self.pipeline.submit(request)
+        finally:
+            self.writer.close()
+
+    def stats(self) -> dict:
+        """订阅端统计信息"""
+        return {
+            "client": str(self.websocket.client),
+            "dropped": self._dropped,
+            "framing": self.framing.stats(),
+            "writer": self.writer.stats(),
+            "requests": self.pipeline.stats(),
+        }
+
+
+class WsServer:
+    """
+    说明:
+        正向ws服务，事件编号后只编码一次，广播给所有订阅端
+
+    参数:
+        * `config`：配置
+        * `message_handler`：ws请求处理函数
+    """
+
+    subscribers: Set[Subscriber]
+    """订阅端"""
+
+    def __init__(
+        self, config: Config, message_handler: Callable[..., Awaitable[WsResponse]]
+    ) -> None:
+        self.access_token = config.access_token
+        self.message_handler = message_handler
+        self.queue_size = config.ws_queue_size
+        self.slow_policy = config.ws_slow_policy
+        self.max_in_flight = config.ws_max_in_flight
+        self.ordered_actions = config.ws_ordered_actions
+        self.use_msgpack = config.ws_msgpack
+        self.buffer = EventBuffer(config.ws_buffer_size)
+        self.subscribers = set()
+        self.slow_disconnects = 0
+
+    async def broadcast(self, body: bytes) -> None:
+        """广播事件，事件为已序列化的json，每种帧编码只编码一次"""
+        seq, body = self.buffer.append(body)
+        frames = {}
+        for subscriber in self.subscribers:
+            framing = subscriber.framing
+            frame = frames.get(framing.binary)
+            if frame is None:
+                frame = frames[framing.binary] = framing.encode(body)
+            subscriber.push(frame, seq)
+
+    async def handle(self, websocket: WebSocket) -> None:
+        """处理正向ws连接"""
+        token = websocket.headers.get("access_token") or websocket.query_params.get(
+            "access_token", ""
+        )
+        if self.access_token and token != self.access_token:
+            logger.error("<m>ws_server</m> - <r>access_token不正确，拒绝连接</r>")
+            await websocket.close(code=1008)
+            return
+        subprotocol = select_subprotocol(
+            websocket.scope.get("subprotocols", []), self.use_msgpack
+        )
+        await websocket.accept(subprotocol=subprotocol)
+        subscriber = Subscriber(self, websocket, Framing(subprotocol))
+        self.subscribers.add(subscriber)
+        logger.success(f"<m>ws_server</m> - <g>订阅端已连接：{websocket.client}</g>")
+        try:
+            await subscriber.run()
+        except WebSocketDisconnect as e:
+            logger.info(f"<m>ws_server</m> - 订阅端已断开：{websocket.client}，{e.code}")
+        finally:
+            self.subscribers.discard(subscriber)
+
+    def stats(self) -> dict:
+        """正向ws统计信息"""
+        return {
+            "subscribers": [subscriber.stats() for subscriber in self.subscribers],
+            "slow_disconnects": self.slow_disconnects,
+            "buffer": self.buffer.stats(),
+        }
+
+    async def close(self) -> None:
+        """断开所有订阅端"""
+        for subscriber in list(self.subscribers):
+            await subscriber.websocket.close(code=1001)
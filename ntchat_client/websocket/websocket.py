@@ -1,17 +1,25 @@
 import asyncio
-import json
-from typing import Callable
+import random
+import time
+from typing import Awaitable, Callable, List, Optional
 
 import websockets
-from websockets.exceptions import ConnectionClosedError, ConnectionClosedOK
+from websockets.exceptions import ConnectionClosed
 from websockets.legacy.client import WebSocketClientProtocol
+from websockets.legacy.framing import prepare_data
 
 from ntchat_client.config import Config
-from ntchat_client.log import logger
+from ntchat_client.log import Payload, logger
 from ntchat_client.model import WsRequest, WsResponse
-from ntchat_client.utils import escape_tag
 from ntchat_client.wechat import get_wechat_client
 
+from . import server
+from .buffer import EVENT_ACTIONS, EventBuffer, handle_event_request
+from .framing import Frame, Framing, offer_subprotocols
+from .pipeline import RequestPipeline
+from .server import ws_server_init
+from .writer import SLOW_POLICIES, WsWriter
+
 ws_manager: "WsManager"
 """全局ws管理端"""
 
@@ -22,19 +30,28 @@ async def websocket_init(config: Config) -> None:
     logger.info("<m>websocket</m> - 正在初始化websocket管理器...")
     wechat_client = get_wechat_client()
     self_id = wechat_client.self_id
-    ws_manager = WsManager(self_id, config)
-    ws_manager.message_handler = wechat_client.handle_ws_api
+    ws_manager = WsManager(self_id, config, wechat_client.handle_ws_api)
     wechat_client.ws_message_handler = ws_manager.send_message
+    wechat_client.actions.register_local("get_ws_stats", ws_manager.stats)
+    if config.ws_server:
+        forward = ws_server_init(config, wechat_client.handle_ws_api)
+        wechat_client.register_sink("ws_server", forward.broadcast, concurrency=1)
+        wechat_client.actions.register_local("get_ws_server_stats", forward.stats)
     logger.success("<m>websocket</m> - <g>websocket管理器初始化完成...</g>")
     if config.ws_address != "":
-        asyncio.create_task(ws_manager.connect())
+        ws_manager.connect_task = asyncio.create_task(ws_manager.connect())
 
 
 async def websocket_shutdown() -> None:
     """关闭websocket"""
     global ws_manager
+    ws_manager.stopping = True
+    if ws_manager.connect_task is not None:
+        ws_manager.connect_task.cancel()
     if not ws_manager.closed:
         await ws_manager.ws_client.close()
+    if server.ws_server is not None:
+        await server.ws_server.close()
 
 
 class WsManager:
@@ -46,8 +63,18 @@ class WsManager:
     """连接认证头"""
     ws_client: WebSocketClientProtocol = None
     """ws连接实例"""
-    message_handler: Callable[..., WsResponse] = None
+    message_handler: Callable[..., Awaitable[WsResponse]] = None
     """ws消息处理函数"""
+    pipeline: RequestPipeline
+    """ws请求并发处理"""
+    buffer: EventBuffer
+    """事件缓存，用于重连后补发"""
+    writer: Optional[WsWriter] = None
+    """当前连接的发送队列，未连接时为None"""
+    connect_task: Optional[asyncio.Task] = None
+    """连接任务"""
+    stopping: bool = False
+    """是否正在关闭，关闭时不再重连"""
 
     @property
     def closed(self) -> bool:
@@ -56,13 +83,53 @@ class WsManager:
             return True
         return self.ws_client.closed
 
-    def __init__(self, self_id: str, config: Config) -> None:
+    def __init__(
+        self,
+        self_id: str,
+        config: Config,
+        message_handler: Callable[..., Awaitable[WsResponse]],
+    ) -> None:
+        if config.ws_slow_policy not in SLOW_POLICIES:
+            raise ValueError(f"ws_slow_policy应为：{'、'.join(SLOW_POLICIES)}")
         self.ws_adress = config.ws_address
         self.headers = {"X-Self-ID": self_id, "access_token": config.access_token}
+        self.message_handler = message_handler
+        self.pipeline = RequestPipeline(
+            self._handle_request,
+            self.send_response,
+            max_in_flight=config.ws_max_in_flight,
+            ordered_actions=config.ws_ordered_actions,
+        )
+        self.buffer = EventBuffer(config.ws_buffer_size)
+        self.compression = "deflate" if config.ws_compression else None
+        self.subprotocols = offer_subprotocols(config.ws_msgpack)
+        self.framing = Framing()
+        self.queue_size = config.ws_queue_size
+        self.slow_policy = config.ws_slow_policy
+        self.reconnect_base = config.ws_reconnect_base
+        self.reconnect_max = config.ws_reconnect_max
+        self._sent_seq = 0
+        """已发送的最新事件序号"""
+        self._queued_seq = 0
+        """已放入发送队列的最新事件序号"""
+        self._acked_seq: Optional[int] = None
+        """对端确认的最新事件序号，对端未确认过时为None"""
+        self._reconnects = 0
+        self._replayed = 0
+        self._dropped = 0
 
     async def connect(self) -> None:
-        """连接ws服务"""
-        while True:
+        """连接ws服务，断开后按指数退避重连，连接保持 `reconnect_max` 以上才重置退避"""
+        attempt = 0
+        while not self.stopping:
+            if attempt:
+                delay = min(
+                    self.reconnect_max, self.reconnect_base * 2 ** (attempt - 1)
+                )
+                await asyncio.sleep(random.uniform(delay / 2, delay))
+                if self.stopping:
+                    return
+            attempt += 1
             try:
                 logger.info(f"<m>websocket</m> - 正在连接到：<g>{self.ws_adress}</g>")
                 self.ws_client = await websockets.connect(
@@ -72,42 +139,146 @@ class WsManager:
                     ping_timeout=20,
                     close_timeout=10,
                     max_size=2**25,
+                    compression=self.compression,
+                    subprotocols=self.subprotocols,
                 )
-                asyncio.create_task(self._task())
-                logger.success("<m>websocket</m> - <g>ws已成功连接！</g>")
-                return
             except Exception as e:
                 logger.error(f"<m>websocket</m> - 连接到ws地址发生错误：<r>{str(e)}</r>")
-                await asyncio.sleep(2)
+                continue
+            connected = time.monotonic()
+            self.framing.negotiate(self.ws_client.subprotocol)
+            logger.success(
+                f"<m>websocket</m> - <g>ws已成功连接！</g>子协议：{self.framing.subprotocol}"
+            )
+            self.writer = WsWriter(
+                self._write,
+                self.queue_size,
+                on_sent=self._on_sent,
+                on_idle=self._refill,
+            )
+            # 补发断开期间的事件
+            self._queued_seq = (
+                self._sent_seq if self._acked_seq is None else self._acked_seq
+            )
+            self._refill()
+            await self._task()
+            self.writer.close()
+            self.writer = None
+            self._reconnects += 1
+            if time.monotonic() - connected >= self.reconnect_max:
+                # 连接稳定后断开，从初始间隔开始重连
+                attempt = 1
 
     async def _task(self) -> None:
-        """循环等待接收任务"""
+        """循环等待接收任务，连接断开后返回"""
         try:
             while True:
                 msg = await self.ws_client.recv()
-                log_msg = escape_tag(msg)
-                if len(log_msg) > 100:
-                    log_msg = log_msg[:100]
-                logger.success(f"<m>websocket</m> - <g>收到ws消息：</g>{log_msg}")
-                msg = json.loads(msg)
-                msg = WsRequest.parse_obj(msg)
-                if self.message_handler:
-                    data = self.message_handler(msg)
-                    asyncio.create_task(self.send_message(data.dict()))
-
-        except ConnectionClosedOK:
-            logger.success("<m>websocket</m> - <g>ws链接已主动关闭...</g>")
-            self.ws_client = None
+                logger.success("<m>websocket</m> - <g>收到ws消息：</g>{}", Payload(msg))
+                data = None
+                try:
+                    data = self.framing.decode(msg)
+                    msg = WsRequest.parse_obj(data)
+                except Exception as e:
+                    logger.error(f"<m>websocket</m> - <r>请求参数不正确：{str(e)}</r>")
+                    await self.pipeline.reject(data, str(e))
+                    continue
+                # 并发处理，不阻塞接收
+                await self.pipeline.submit(msg)
 
-        except ConnectionClosedError as e:
-            logger.error(f"<m>websocket</m> - ws链接异常关闭：<r>{e.code}</r>")
-            # 自启动
+        except ConnectionClosed as e:
+            if self.stopping:
+                logger.success("<m>websocket</m> - <g>ws链接已主动关闭...</g>")
+            else:
+                logger.error(f"<m>websocket</m> - ws链接关闭：<r>{e.code}</r>，正在重连...")
             self.ws_client = None
-            await self.connect()
-
-    async def send_message(self, message: dict) -> None:
-        """发送ws消息"""
-        if not self.closed:
-            data = json.dumps(message, ensure_ascii=False)
-            logger.debug(f"<m>websocket</m> - <e>向ws发送消息：</e>{escape_tag(data)}")
-            await self.ws_client.send(data)
+
+    async def _handle_request(self, request: WsRequest) -> WsResponse:
+        """处理ws请求，事件确认及补发在本地处理"""
+        if request.action in EVENT_ACTIONS:
+            return await handle_event_request(
+                request, self.buffer, self.replay, self._ack
+            )
+        return await self.message_handler(request)
+
+    def _ack(self, seq: int) -> None:
+        """对端确认事件"""
+        self._acked_seq = max(seq, self._acked_seq or 0)
+
+    def _on_sent(self, seq: int) -> None:
+        """事件已写入连接"""
+        self._sent_seq = max(self._sent_seq, seq)
+
+    async def replay(self, seq: int) -> int:
+        """补发序号大于seq的缓存事件，返回补发数量"""
+        if self.writer is None:
+            return 0
+        count = len(self.buffer.since(seq))
+        self._queued_seq = min(self._queued_seq, seq)
+        self._refill()
+        return count
+
+    def _refill(self) -> None:
+        """将未放入发送队列的缓存事件按顺序放入，直到队列已满"""
+        if self.writer is None or self._queued_seq >= self.buffer.seq:
+            return
+        count = 0
+        for seq, body in self.buffer.since(self._queued_seq):
+            if not self.writer.push(self.framing.encode(body), seq):
+                break
+            self._queued_seq = seq
+            count += 1
+        if count:
+            logger.info(f"<m>websocket</m> - 已补发{count}条事件")
+            self._replayed += count
+
+    async def _write(self, frames: List[Frame]) -> None:
+        """写入多个帧，只等待一次发送缓冲区"""
+        if self.closed:
+            raise ConnectionClosed(None, None)
+        client = self.ws_client
+        await client.ensure_open()
+        for frame in frames:
+            logger.debug("<m>websocket</m> - <e>向ws发送消息：</e>{}", Payload(frame.data))
+            opcode, data = prepare_data(frame.data)
+            client.write_frame_sync(True, opcode, data)
+            self.framing.sent(frame)
+        await client.drain()
+
+    async def send_message(self, message: bytes) -> None:
+        """发送ws事件，事件为已序列化的json，会编号并缓存，断开期间的事件在重连后补发"""
+        seq, message = self.buffer.append(message)
+        if self.writer is None:
+            return
+        if self.buffer.enabled and seq != self._queued_seq + 1:
+            # 之前的事件还未放入发送队列，等待队列清空后按顺序补发
+            return
+        if self.writer.push(self.framing.encode(message), seq):
+            self._queued_seq = seq
+            return
+        if self.slow_policy == "disconnect":
+            if self.ws_client.open:
+                logger.warning("<m>websocket</m> - ws发送队列已满，断开连接...")
+                asyncio.create_task(self.ws_client.close(code=1013))
+        elif not self.buffer.enabled:
+            self._dropped += 1
+
+    async def send_response(self, message: bytes) -> None:
+        """发送ws响应，响应为已序列化的json，发送队列已满时等待"""
+        if self.writer is not None:
+            await self.writer.put(self.framing.encode(message))
+
+    def stats(self) -> dict:
+        """ws统计信息"""
+        return {
+            "connected": not self.closed,
+            "reconnects": self._reconnects,
+            "sent_seq": self._sent_seq,
+            "acked_seq": self._acked_seq,
+            "replayed": self._replayed,
+            "dropped": self._dropped,
+            "buffer": self.buffer.stats(),
+            "framing": self.framing.stats(),
+            "writer": self.writer.stats() if self.writer is not None else None,
+            "requests": self.pipeline.stats(),
+        }
@@ -0,0 +1,133 @@
+"""
+ws发送队列
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Optional, Tuple
+
+from ntchat_client.log import logger
+
+from .framing import Frame
+
+SLOW_POLICIES = ("disconnect", "drop")
+"""发送队列已满时的处理策略"""
+
+FrameWriter = Callable[[List[Frame]], Awaitable[None]]
+"""写入函数，一次写入多个帧"""
+
+
+class WsWriter:
+    """
+    说明:
+        单个ws连接的发送队列，所有消息由唯一的发送任务按入队顺序发送
+
+        发送任务每次取出队列中已有的多个帧一起写入，减少等待次数
+
+    参数:
+        * `write`：写入函数
+        * `max_size`：队列最大长度
+        * `max_batch`：每次最多写入的帧数
+        * `on_sent`：写入成功后的回调，参数为本次写入的最大事件序号
+        * `on_idle`：队列清空后的回调
+    """
+
+    _queue: Deque[Tuple[Frame, int, float]]
+    """待发送的帧：(帧, 事件序号, 入队时间)，响应的序号为0"""
+
+    def __init__(
+        self,
+        write: FrameWriter,
+        max_size: int,
+        max_batch: int = 64,
+        on_sent: Optional[Callable[[int], None]] = None,
+        on_idle: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self._write = write
+        self._max_size = max_size
+        self._max_batch = max_batch
+        self._on_sent = on_sent
+        self._on_idle = on_idle
+        self._queue = deque()
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._task = asyncio.create_task(self._run())
+        self._max_depth = 0
+        self._frames = 0
+        self._writes = 0
+        self._bytes = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    @property
+    def full(self) -> bool:
+        """队列是否已满"""
+        return len(self._queue) >= self._max_size
+
+    def push(self, frame: Frame, seq: int = 0) -> bool:
+        """放入帧，队列已满时返回False"""
+        if self.full:
+            return False
+        self._queue.append((frame, seq, time.monotonic()))
+        self._max_depth = max(self._max_depth, len(self._queue))
+        if self.full:
+            self._space.clear()
+        self._ready.set()
+        return True
+
+    async def put(self, frame: Frame, seq: int = 0) -> None:
+        """放入帧，队列已满时等待"""
+        while not self.push(frame, seq):
+            await self._space.wait()
+
+    async def _run(self) -> None:
+        """发送循环"""
+        while True:
+            await self._ready.wait()
+            if not self._queue:
+                self._ready.clear()
+                if self._on_idle is not None:
+                    self._on_idle()
+                continue
+            count = min(len(self._queue), self._max_batch)
+            batch = [self._queue.popleft() for _ in range(count)]
+            self._space.set()
+            try:
+                await self._write([frame for frame, _, _ in batch])
+            except Exception as e:
+                logger.error(f"<m>websocket</m> - 发送ws消息出错：<r>{str(e)}</r>")
+                self._queue.clear()
+                self._ready.clear()
+                continue
+            now = time.monotonic()
+            self._writes += 1
+            seq = 0
+            for frame, frame_seq, enqueued in batch:
+                latency = now - enqueued
+                self._latency_total += latency
+                self._latency_max = max(self._latency_max, latency)
+                self._bytes += frame.size
+                seq = max(seq, frame_seq)
+            self._frames += count
+            if seq and self._on_sent is not None:
+                self._on_sent(seq)
+
+    def stats(self) -> dict:
+        """发送统计信息"""
+        frames = self._frames or 1
+        return {
+            "depth": len(self._queue),
+            "max_depth": self._max_depth,
+            "frames": self._frames,
+            "writes": self._writes,
+            "bytes": self._bytes,
+            "avg_latency_ms": self._latency_total / frames * 1000,
+            "max_latency_ms": self._latency_max * 1000,
+        }
+
+    def close(self) -> None:
+        """停止发送并清空队列"""
+        self._task.cancel()
+        self._queue.clear()
+        self._space.set()
@@ -5,6 +5,8 @@ import base64
 import sys
 from datetime import datetime, timedelta
 from pathlib import Path
+from threading import Event, Lock
+from typing import Optional
 from urllib.parse import unquote
 
 from httpx import Client
@@ -25,6 +27,7 @@ class FileCache:
 
     def __init__(self, cache_path: str) -> None:
         self._seq: int = 1
+        self._seq_lock = Lock()
         self._client = Client(
             headers={
                 "User-Agent": "Mozilla/5.0(X11; Linux x86_64; rv:12.0) Gecko/20100101 Firefox/12.0"
@@ -33,8 +36,9 @@ class FileCache:
         Path(cache_path).mkdir(parents=True, exist_ok=True)
 
     def get_seq(self) -> str:
-        s = self._seq
-        self._seq = (self._seq + 1) % sys.maxsize
+        with self._seq_lock:
+            s = self._seq
+            self._seq = (self._seq + 1) % sys.maxsize
         return f"{str(s)}.file"
 
     def _save(self, file: bytes, path: Path) -> None:
@@ -42,10 +46,18 @@ class FileCache:
         with open(path, mode="wb") as f:
             f.write(file)
 
-    def get(self, url: str) -> bytes:
-        """请求获取url文件"""
-        res = self._client.get(url)
-        return res.content
+    def get(self, url: str, cancel: Optional[Event] = None) -> bytes:
+        """请求获取url文件，设置取消标记后将中断下载"""
+        if cancel is None:
+            res = self._client.get(url)
+            return res.content
+        chunks = []
+        with self._client.stream("GET", url) as res:
+            for chunk in res.iter_bytes():
+                if cancel.is_set():
+                    raise RuntimeError("下载已取消")
+                chunks.append(chunk)
+        return b"".join(chunks)
 
     def save_file(self, cache_path: Path, file: bytes) -> Path:
         """储存文件，返回路径"""
@@ -54,7 +66,9 @@ class FileCache:
         self._save(file, path)
         return path
 
-    def handle_file(self, file: str, file_path: str) -> str:
+    def handle_file(
+        self, file: str, file_path: str, cancel: Optional[Event] = None
+    ) -> str:
         """处理文件url"""
         file_type = URL(file)
 
@@ -68,7 +82,7 @@ class FileCache:
 
         elif file_type.scheme == "http" or file_type.scheme == "https":
             filename = Path(file_path) / self.get_seq()
-            file_value = self.get(file)
+            file_value = self.get(file, cancel)
             self._save(file_value, filename)
             return str(filename.absolute())
 
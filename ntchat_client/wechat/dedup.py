@@ -0,0 +1,84 @@
+"""
+事件去重
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any
+
+from ntchat_client.codec import dumps
+
+
+class EventDeduplicator:
+    """
+    说明:
+        按消息id去重，没有消息id的事件使用内容哈希
+
+        最多记录 `max_size` 个事件，超过 `window` 秒的记录自动过期，内存占用固定
+
+    参数:
+        * `window`：去重时间窗口(s)
+        * `max_size`：最多记录的事件数
+    """
+
+    _seen: "OrderedDict[Any, float]"
+    """事件键 -> 首次收到时间，按收到顺序排列"""
+
+    def __init__(self, window: float, max_size: int) -> None:
+        self._window = window
+        self._max_size = max_size
+        self._seen = OrderedDict()
+        self._lock = Lock()
+        self._checked = 0
+        self._duplicates = 0
+        self._by_id = 0
+        self._by_hash = 0
+        self._evicted = 0
+
+    @staticmethod
+    def _key(message: dict) -> Any:
+        """事件键，优先使用消息id"""
+        msgid = message["data"].get("msgid")
+        if msgid:
+            return message["type"], msgid
+        return hashlib.blake2b(dumps(message), digest_size=16).digest()
+
+    def seen(self, message: dict) -> bool:
+        """是否为重复事件，不是时记录该事件"""
+        key = self._key(message)
+        now = time.monotonic()
+        with self._lock:
+            self._checked += 1
+            # 清理过期记录，最旧的在前
+            expire = now - self._window
+            while self._seen:
+                oldest_key, first_seen = next(iter(self._seen.items()))
+                if first_seen > expire:
+                    break
+                del self._seen[oldest_key]
+            if key in self._seen:
+                self._duplicates += 1
+                if isinstance(key, tuple):
+                    self._by_id += 1
+                else:
+                    self._by_hash += 1
+                return True
+            self._seen[key] = now
+            if len(self._seen) > self._max_size:
+                self._seen.popitem(last=False)
+                self._evicted += 1
+            return False
+
+    def stats(self) -> dict:
+        """去重统计信息"""
+        return {
+            "size": len(self._seen),
+            "max_size": self._max_size,
+            "window": self._window,
+            "checked": self._checked,
+            "duplicates": self._duplicates,
+            "duplicates_by_id": self._by_id,
+            "duplicates_by_hash": self._by_hash,
+            "evicted": self._evicted,
+        }
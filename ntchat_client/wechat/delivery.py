@@ -0,0 +1,215 @@
+"""
+事件投递队列
+"""
+import asyncio
+import threading
+import time
+from asyncio import AbstractEventLoop
+from collections import deque
+from itertools import count
+from typing import Any, Awaitable, Callable, Deque, List, NamedTuple, Optional, Tuple
+
+from ntchat_client.log import logger
+
+DELIVERY_POLICIES = ("block", "drop_oldest", "drop_low_priority")
+"""队列已满时的处理策略"""
+
+PRIORITY_NORMAL = 0
+"""普通事件"""
+PRIORITY_LOW = 1
+"""低优先级事件，队列已满时优先丢弃"""
+
+Handler = Callable[[bytes], Awaitable[Any]]
+"""上报函数"""
+Accept = Callable[[int, dict], bool]
+"""事件过滤函数：(事件类型, 事件数据) -> 是否上报"""
+
+
+class Sink(NamedTuple):
+    """上报端"""
+
+    handler: Handler
+    """上报函数"""
+    accept: Optional[Accept]
+    """事件过滤函数"""
+    concurrency: Optional[int]
+    """同时上报数"""
+
+
+class DeliveryQueue:
+    """
+    说明:
+        ntchat回调线程与事件循环之间的有界投递队列，每个上报端一个
+
+        回调线程只负责入队，事件循环中的任务按入队顺序取出并上报，同时上报数不超过 `concurrency`
+
+    参数:
+        * `name`：上报端名称
+        * `handler`：上报函数
+        * `loop`：事件循环
+        * `max_size`：队列最大长度
+        * `policy`：队列已满时的策略，`block` 阻塞回调线程，`drop_oldest` 丢弃最旧的事件，`drop_low_priority` 优先丢弃最旧的低优先级事件
+        * `block_timeout`：`block` 策略最长阻塞时间(s)，超时后丢弃新事件
+        * `concurrency`：同时上报数，为1时按顺序上报
+    """
+
+    _lanes: List[Deque[Tuple[int, bytes]]]
+    """优先级通道，元素为 (序号, 事件)"""
+
+    def __init__(
+        self,
+        name: str,
+        handler: Handler,
+        loop: AbstractEventLoop,
+        max_size: int,
+        policy: str,
+        block_timeout: float,
+        concurrency: int,
+    ) -> None:
+        if policy not in DELIVERY_POLICIES:
+            raise ValueError(f"delivery_policy应为：{'、'.join(DELIVERY_POLICIES)}")
+        self.name = name
+        self.handler = handler
+        self._loop = loop
+        self._max_size = max_size
+        self._policy = policy
+        self._block_timeout = block_timeout
+        self._concurrency = concurrency
+        self._lanes = [deque(), deque()]
+        self._seq = count()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._closed = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight = 0
+        self._max_depth = 0
+        self._queued = 0
+        self._dropped = 0
+        self._blocked = 0
+        self._delivered = 0
+        self._failed = 0
+
+    def put(self, body: bytes, priority: int = PRIORITY_NORMAL) -> bool:
+        """
+        说明:
+            在回调线程中入队，事件被丢弃时返回False
+
+        参数:
+            * `body`：已序列化的事件
+            * `priority`：优先级
+        """
+        with self._lock:
+            if self._closed:
+                return False
+            if self._size >= self._max_size and not self._make_room(priority):
+                self._dropped += 1
+                return False
+            self._lanes[priority].append((next(self._seq), body))
+            self._size += 1
+            self._queued += 1
+            self._max_depth = max(self._max_depth, self._size)
+            was_empty = self._size == 1
+        if was_empty:
+            self._loop.call_soon_threadsafe(self._wake)
+        return True
+
+    def _make_room(self, priority: int) -> bool:
+        """队列已满时按策略腾出位置，需持有锁，无法腾出时返回False"""
+        if self._policy == "block":
+            self._blocked += 1
+            deadline = time.monotonic() + self._block_timeout
+            while self._size >= self._max_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._not_full.wait(remaining)
+            return not self._closed
+        if self._policy == "drop_oldest":
+            lane = self._oldest_lane()
+        else:
+            # 从最低优先级开始丢弃，不会丢弃比新事件优先级更高的事件
+            lane = next((one for one in reversed(self._lanes[priority:]) if one), None)
+            if lane is None:
+                return False
+        lane.popleft()
+        self._size -= 1
+        self._dropped += 1
+        return True
+
+    def _oldest_lane(self) -> Optional[Deque[Tuple[int, bytes]]]:
+        """最旧事件所在的通道，需持有锁"""
+        oldest = None
+        for lane in self._lanes:
+            if lane and (oldest is None or lane[0][0] < oldest[0][0]):
+                oldest = lane
+        return oldest
+
+    def _pop(self) -> Optional[bytes]:
+        """按入队顺序取出事件"""
+        with self._lock:
+            lane = self._oldest_lane()
+            if lane is None:
+                return None
+            _, body = lane.popleft()
+            self._size -= 1
+            self._not_full.notify()
+            return body
+
+    def _wake(self) -> None:
+        """在事件循环中唤醒投递任务"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        """投递循环"""
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while True:
+                # 先等待空位，事件留在队列中由溢出策略处理
+                await self._semaphore.acquire()
+                body = self._pop()
+                if body is None:
+                    self._semaphore.release()
+                    break
+                self._in_flight += 1
+                asyncio.create_task(self._deliver(body))
+
+    async def _deliver(self, body: bytes) -> None:
+        """上报单个事件"""
+        try:
+            await self.handler(body)
+            self._delivered += 1
+        except Exception as e:
+            self._failed += 1
+            logger.error(f"<m>wechat</m> - {self.name}上报事件出错：<r>{str(e)}</r>")
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        """投递统计信息"""
+        return {
+            "depth": self._size,
+            "max_depth": self._max_depth,
+            "in_flight": self._in_flight,
+            "queued": self._queued,
+            "dropped": self._dropped,
+            "blocked": self._blocked,
+            "delivered": self._delivered,
+            "failed": self._failed,
+        }
+
+    def close(self) -> None:
+        """关闭队列，唤醒阻塞的回调线程"""
+        with self._lock:
+            self._closed = True
+            self._not_full.notify_all()
+        if self._task is not None:
+            self._task.cancel()
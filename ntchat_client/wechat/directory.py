@@ -0,0 +1,296 @@
+"""
+联系人及群目录
+"""
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from collections import deque
+from itertools import chain
+from threading import Lock
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+import ntchat
+
+from ntchat_client.log import logger
+
+DIRECTORY_KINDS = ("all", "contact", "room")
+"""搜索范围"""
+
+MAX_GRAM = 3
+"""子串索引的最大长度，更长的关键词按三元组求交后校验"""
+
+_ROOM_RENAME = re.compile(r"修改群名为[“\"](.+)[”\"]")
+"""改群名系统消息"""
+
+_EVENT_TYPES = frozenset(
+    (
+        ntchat.MT_CONTACT_ADD_NOITFY_MSG,
+        ntchat.MT_CONTACT_DEL_NOTIFY_MSG,
+        ntchat.MT_ROOM_CREATE_NOTIFY_MSG,
+        ntchat.MT_RECV_SYSTEM_MSG,
+    )
+)
+"""会更新目录的事件类型"""
+
+MAX_PENDING = 10000
+"""加载完成前最多暂存的事件数，加载失败时不会无限增长"""
+
+
+def _load_pinyin() -> Optional[Callable[[str], Tuple[str, str]]]:
+    """加载pypinyin，返回 (全拼, 首字母) 转换函数，未安装时返回None"""
+    try:
+        from pypinyin import Style, lazy_pinyin
+    except ImportError:
+        return None
+
+    def convert(text: str) -> Tuple[str, str]:
+        full = lazy_pinyin(text)
+        initials = lazy_pinyin(text, style=Style.FIRST_LETTER)
+        return "".join(full), "".join(initials)
+
+    return convert
+
+
+_pinyin = _load_pinyin()
+
+
+def normalize(text: str) -> str:
+    """统一全半角及大小写"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+class _Entry:
+    """目录条目"""
+
+    __slots__ = ("kind", "data", "prefix_keys", "gram_keys")
+
+    def __init__(self, kind: str, data: dict) -> None:
+        self.kind = kind
+        self.data = data
+        self.prefix_keys: Set[str] = set()
+        """前缀索引的键：wxid、微信号、名称、拼音"""
+        self.gram_keys: Set[str] = set()
+        """子串索引的键：名称"""
+        for field in ("wxid", "account"):
+            value = data.get(field)
+            if value:
+                self.prefix_keys.add(normalize(value))
+        for field in ("nickname", "remark"):
+            value = data.get(field)
+            if not value:
+                continue
+            key = normalize(value)
+            self.prefix_keys.add(key)
+            self.gram_keys.add(key)
+            if _pinyin is not None and not key.isascii():
+                self.prefix_keys.update(_pinyin(key))
+
+    def grams(self) -> Set[str]:
+        """名称的所有长度不超过 `MAX_GRAM` 的子串"""
+        grams = set()
+        for key in self.gram_keys:
+            for size in range(1, MAX_GRAM + 1):
+                for start in range(len(key) - size + 1):
+                    grams.add(key[start : start + size])
+        return grams
+
+
+class ContactDirectory:
+    """
+    说明:
+        内存中的联系人及群目录，登录后从 `get_contacts`、`get_rooms` 加载，并根据事件更新
+
+        wxid、微信号、名称及拼音建立有序前缀索引，名称建立子串索引，搜索不经过ntchat
+
+        加载期间收到的事件先暂存，加载完成后按顺序应用到新目录
+
+        安装 `pypinyin` 后可用全拼或首字母搜索中文名称
+    """
+
+    _entries: Dict[str, _Entry]
+    """wxid -> 条目"""
+    _prefix: List[Tuple[str, str]]
+    """有序的 (键, wxid)"""
+    _grams: Dict[str, Set[str]]
+    """子串 -> wxid"""
+    _pending: Deque[Tuple[int, dict]]
+    """加载完成前收到的事件"""
+
+    def __init__(self) -> None:
+        self._entries = {}
+        self._prefix = []
+        self._grams = {}
+        self._pending = deque(maxlen=MAX_PENDING)
+        self._lock = Lock()
+        self.loaded = False
+        """是否已加载"""
+        self._searches = 0
+
+    def load(self, contacts: List[dict], rooms: List[dict]) -> None:
+        """加载全部联系人及群，替换已有目录"""
+        entries = {}
+        for kind, items in (("contact", contacts), ("room", rooms)):
+            for data in items:
+                wxid = data.get("wxid")
+                if wxid:
+                    entries[wxid] = _Entry(kind, data)
+        prefix = sorted(
+            (key, wxid) for wxid, entry in entries.items() for key in entry.prefix_keys
+        )
+        grams: Dict[str, Set[str]] = {}
+        for wxid, entry in entries.items():
+            for gram in entry.grams():
+                grams.setdefault(gram, set()).add(wxid)
+        with self._lock:
+            self._entries = entries
+            self._prefix = prefix
+            self._grams = grams
+        # 应用加载期间的事件，暂存清空时才标记已加载，之后的事件直接应用
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self.loaded = True
+                    break
+                msgtype, data = self._pending.popleft()
+            self._apply(msgtype, data)
+        logger.info(
+            f"<m>wechat</m> - 联系人目录已加载：联系人{len(contacts)}个，群{len(rooms)}个"
+        )
+
+    def upsert(self, kind: str, data: dict) -> None:
+        """添加或更新条目，更新时合并字段"""
+        wxid = data.get("wxid")
+        if not wxid:
+            return
+        with self._lock:
+            old = self._entries.get(wxid)
+            if old is not None:
+                data = {**old.data, **data}
+                self._remove(wxid)
+            entry = _Entry(kind, data)
+            self._entries[wxid] = entry
+            for key in entry.prefix_keys:
+                insort(self._prefix, (key, wxid))
+            for gram in entry.grams():
+                self._grams.setdefault(gram, set()).add(wxid)
+
+    def remove(self, wxid: str) -> None:
+        """删除条目"""
+        with self._lock:
+            self._remove(wxid)
+
+    def _remove(self, wxid: str) -> None:
+        """删除条目，需持有锁"""
+        entry = self._entries.pop(wxid, None)
+        if entry is None:
+            return
+        for key in entry.prefix_keys:
+            index = bisect_left(self._prefix, (key, wxid))
+            if index < len(self._prefix) and self._prefix[index] == (key, wxid):
+                del self._prefix[index]
+        for gram in entry.grams():
+            wxids = self._grams.get(gram)
+            if wxids is not None:
+                wxids.discard(wxid)
+                if not wxids:
+                    del self._grams[gram]
+
+    def handle_event(self, msgtype: int, data: dict) -> None:
+        """根据事件更新目录，加载完成前暂存"""
+        if msgtype not in _EVENT_TYPES:
+            return
+        with self._lock:
+            if not self.loaded:
+                self._pending.append((msgtype, data))
+                return
+        self._apply(msgtype, data)
+
+    def _apply(self, msgtype: int, data: dict) -> None:
+        """应用事件"""
+        if msgtype == ntchat.MT_CONTACT_ADD_NOITFY_MSG:
+            self.upsert("contact", data)
+        elif msgtype == ntchat.MT_CONTACT_DEL_NOTIFY_MSG:
+            self.remove(data.get("wxid", ""))
+        elif msgtype == ntchat.MT_ROOM_CREATE_NOTIFY_MSG:
+            room = dict(data)
+            room.setdefault("wxid", data.get("room_wxid"))
+            self.upsert("room", room)
+        elif msgtype == ntchat.MT_RECV_SYSTEM_MSG:
+            match = _ROOM_RENAME.search(data.get("raw_msg", ""))
+            room_wxid = data.get("room_wxid") or data.get("from_wxid")
+            if match is not None and room_wxid in self._entries:
+                self.upsert("room", {"wxid": room_wxid, "nickname": match.group(1)})
+
+    def search(self, keyword: str, kind: str = "all", limit: int = 20) -> List[dict]:
+        """
+        说明:
+            搜索联系人及群，完全匹配在前，其次为前缀匹配（按键排序），最后为名称子串匹配
+
+            找到足够的结果后立即返回，不会遍历所有匹配项
+
+        参数:
+            * `keyword`：关键词，匹配wxid、微信号、昵称、备注，名称可用拼音
+            * `kind`：搜索范围，all、contact、room
+            * `limit`：最多返回条数
+        """
+        if kind not in DIRECTORY_KINDS:
+            raise ValueError(f"kind应为：{'、'.join(DIRECTORY_KINDS)}")
+        query = normalize(keyword)
+        if not query or limit <= 0:
+            return []
+        results: Dict[str, _Entry] = {}
+        with self._lock:
+            self._searches += 1
+            for wxid in chain(self._prefix_match(query), self._substring(query)):
+                if wxid in results:
+                    continue
+                entry = self._entries[wxid]
+                if kind != "all" and entry.kind != kind:
+                    continue
+                results[wxid] = entry
+                if len(results) >= limit:
+                    break
+            return [{"kind": entry.kind, **entry.data} for entry in results.values()]
+
+    def _prefix_match(self, query: str) -> Iterator[str]:
+        """键以query开头的wxid，完全匹配的键排在最前，需持有锁"""
+        index = bisect_left(self._prefix, (query, ""))
+        while index < len(self._prefix):
+            key, wxid = self._prefix[index]
+            if not key.startswith(query):
+                return
+            yield wxid
+            index += 1
+
+    def _substring(self, query: str) -> Iterator[str]:
+        """名称包含query的wxid，需持有锁"""
+        if len(query) <= MAX_GRAM:
+            yield from self._grams.get(query, ())
+            return
+        postings = []
+        for start in range(len(query) - MAX_GRAM + 1):
+            wxids = self._grams.get(query[start : start + MAX_GRAM])
+            if not wxids:
+                return
+            postings.append(wxids)
+        postings.sort(key=len)
+        for wxid in postings[0]:
+            if all(wxid in wxids for wxids in postings[1:]) and any(
+                query in key for key in self._entries[wxid].gram_keys
+            ):
+                yield wxid
+
+    def stats(self) -> dict:
+        """目录统计信息"""
+        with self._lock:
+            contacts = sum(entry.kind == "contact" for entry in self._entries.values())
+            return {
+                "loaded": self.loaded,
+                "contacts": contacts,
+                "rooms": len(self._entries) - contacts,
+                "prefix_keys": len(self._prefix),
+                "grams": len(self._grams),
+                "pending": len(self._pending),
+                "pinyin": _pinyin is not None,
+                "searches": self._searches,
+            }
@@ -0,0 +1,147 @@
+"""
+接口调度表
+"""
+import inspect
+from dataclasses import dataclass
+from threading import Event
+from typing import Any, Callable, Dict, Optional
+
+from ntchat_client.model import Response
+
+from .pagination import PAGEABLE_ACTIONS
+
+PreHandler = Callable[[dict, Optional[Event]], dict]
+"""参数预处理函数"""
+Shaper = Callable[[Any], Response]
+"""结果处理函数"""
+
+EXCLUDED_ACTIONS = {
+    "open",
+    "on",
+    "msg_register",
+    "wait_login",
+    "on_close",
+    "on_recv",
+    "bind_client_id",
+    "send",
+    "send_sync",
+}
+"""ntchat.WeChat 上不允许作为接口调用的方法"""
+
+FILE_PARAMS: Dict[str, str] = {
+    "send_image": "file_path",
+    "send_file": "file_path",
+    "send_video": "file_path",
+    "send_gif": "file",
+}
+"""需要预处理文件的接口：接口名 -> 文件参数名"""
+
+_DATA_TYPES = (bool, dict, list, str)
+
+
+def shape_result(result: Any) -> Response:
+    """默认结果处理"""
+    if isinstance(result, _DATA_TYPES):
+        return Response(status=200, msg="调用成功", data=result)
+    return Response(status=204, msg="调用成功，但没有返回结果", data={})
+
+
+def is_read_only(name: str) -> bool:
+    """根据接口名判断是否只读"""
+    return name.startswith("get_") or name == "search_contacts"
+
+
+@dataclass
+class ActionSpec:
+    """接口描述"""
+
+    name: str
+    """接口名"""
+    func: Callable[..., Any]
+    """调用函数"""
+    signature: Optional[inspect.Signature]
+    """函数签名，用于提前校验参数"""
+    pre_handle: Optional[PreHandler] = None
+    """参数预处理"""
+    shape: Shaper = shape_result
+    """结果处理"""
+    read_only: bool = False
+    """是否只读"""
+    local: bool = False
+    """是否为本地接口，本地接口直接在事件循环中执行"""
+    pageable: bool = False
+    """是否支持分页"""
+    sendable: bool = False
+    """是否为发送消息接口，启用发送队列时经过队列限速"""
+
+    def bind(self, params: Optional[dict]) -> None:
+        """校验参数，参数不匹配时抛出 `TypeError`"""
+        if self.signature is not None:
+            self.signature.bind(**(params or {}))
+
+
+class ActionRegistry:
+    """接口注册表"""
+
+    _actions: Dict[str, ActionSpec]
+
+    def __init__(self) -> None:
+        self._actions = {}
+
+    def get(self, name: str) -> Optional[ActionSpec]:
+        """获取接口，不存在返回None"""
+        return self._actions.get(name)
+
+    def is_read_only(self, name: str) -> bool:
+        """接口是否只读，不存在的接口视为非只读"""
+        spec = self._actions.get(name)
+        return spec is not None and spec.read_only
+
+    def register(self, spec: ActionSpec) -> None:
+        """注册接口"""
+        self._actions[spec.name] = spec
+
+    def register_local(
+        self, name: str, func: Callable[..., Any], read_only: bool = True
+    ) -> None:
+        """注册本地接口"""
+        self.register(
+            ActionSpec(
+                name=name,
+                func=func,
+                signature=inspect.signature(func),
+                read_only=read_only,
+                local=True,
+            )
+        )
+
+    def load_wechat(self, wechat: Any, pre_handles: Dict[str, PreHandler]) -> None:
+        """
+        说明:
+            从 `ntchat.WeChat` 实例生成接口表，私有方法及非接口方法不会注册
+
+        参数:
+            * `wechat`：微信实例
+            * `pre_handles`：接口参数预处理函数
+        """
+        for name, _ in inspect.getmembers(type(wechat), inspect.isfunction):
+            if name.startswith("_") or name in EXCLUDED_ACTIONS:
+                continue
+            if name in self._actions and self._actions[name].local:
+                continue
+            func = getattr(wechat, name)
+            try:
+                signature = inspect.signature(func)
+            except (TypeError, ValueError):
+                signature = None
+            self.register(
+                ActionSpec(
+                    name=name,
+                    func=func,
+                    signature=signature,
+                    pre_handle=pre_handles.get(name),
+                    read_only=is_read_only(name),
+                    pageable=name in PAGEABLE_ACTIONS,
+                    sendable=name.startswith("send_"),
+                )
+            )
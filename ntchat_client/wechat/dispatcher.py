@@ -0,0 +1,130 @@
+"""
+按会话分片的事件分发
+"""
+import zlib
+from collections import Counter
+from queue import Queue
+from threading import Lock, Thread
+from typing import Callable, FrozenSet, List, Optional
+
+from ntchat_client.log import logger
+
+
+class _Shard:
+    """单个分片：有界队列及处理线程"""
+
+    def __init__(self, index: int, max_size: int) -> None:
+        self.index = index
+        self.queue: Queue = Queue(max_size)
+        self.lock = Lock()
+        self.conversations: Counter = Counter()
+        """队列中各会话的事件数"""
+        self.max_depth = 0
+        self.processed = 0
+        self.failed = 0
+        self.blocked = 0
+        self.thread: Optional[Thread] = None
+
+
+class EventDispatcher:
+    """
+    说明:
+        按会话将事件分配到多个分片，每个分片由一个线程按顺序处理
+
+        同一会话的事件总在同一分片中，保持接收顺序；不同会话的事件并行处理
+
+        分片队列已满时阻塞ntchat回调线程，事件不会丢失
+
+    参数:
+        * `handler`：事件处理函数，参数为 (会话, 事件, 上报端)
+        * `shards`：分片数
+        * `max_size`：每个分片的队列长度
+    """
+
+    _shards: List[_Shard]
+    """分片"""
+
+    def __init__(
+        self,
+        handler: Callable[[str, dict, Optional[FrozenSet[str]]], None],
+        shards: int,
+        max_size: int,
+    ) -> None:
+        self._handler = handler
+        self._shards = [_Shard(index, max_size) for index in range(shards)]
+        for shard in self._shards:
+            shard.thread = Thread(
+                target=self._run, args=(shard,), name=f"dispatch_{shard.index}", daemon=True
+            )
+            shard.thread.start()
+
+    def _shard(self, conversation: str) -> _Shard:
+        """会话所在分片，重启后不变"""
+        return self._shards[zlib.crc32(conversation.encode()) % len(self._shards)]
+
+    def dispatch(
+        self,
+        conversation: str,
+        message: dict,
+        route: Optional[FrozenSet[str]] = None,
+    ) -> None:
+        """在回调线程中将事件放入会话所在分片，`route` 为规则指定的上报端"""
+        shard = self._shard(conversation)
+        with shard.lock:
+            shard.conversations[conversation] += 1
+        if shard.queue.full():
+            shard.blocked += 1
+            logger.warning(f"<m>wechat</m> - 事件分片{shard.index}队列已满，等待处理...")
+        shard.queue.put((conversation, message, route))
+        shard.max_depth = max(shard.max_depth, shard.queue.qsize())
+
+    def _run(self, shard: _Shard) -> None:
+        """分片处理循环"""
+        while True:
+            item = shard.queue.get()
+            if item is None:
+                return
+            conversation, message, route = item
+            try:
+                self._handler(conversation, message, route)
+            except Exception as e:
+                shard.failed += 1
+                logger.error(f"<m>wechat</m> - 处理事件出错：<r>{str(e)}</r>")
+            shard.processed += 1
+            with shard.lock:
+                shard.conversations[conversation] -= 1
+                if not shard.conversations[conversation]:
+                    del shard.conversations[conversation]
+
+    def stats(self, top: int = 3) -> dict:
+        """
+        说明:
+            各分片统计信息
+
+        参数:
+            * `top`：每个分片列出排队事件最多的会话数
+        """
+        shards = []
+        for shard in self._shards:
+            with shard.lock:
+                hot = shard.conversations.most_common(top)
+            shards.append(
+                {
+                    "shard": shard.index,
+                    "depth": shard.queue.qsize(),
+                    "max_depth": shard.max_depth,
+                    "processed": shard.processed,
+                    "failed": shard.failed,
+                    "blocked": shard.blocked,
+                    "hot": [
+                        {"conversation": conversation, "depth": depth}
+                        for conversation, depth in hot
+                    ],
+                }
+            )
+        return {"shards": shards}
+
+    def close(self) -> None:
+        """处理完已入队的事件后停止"""
+        for shard in self._shards:
+            shard.queue.put(None)
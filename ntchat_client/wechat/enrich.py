@@ -0,0 +1,240 @@
+"""
+事件信息补充
+"""
+import asyncio
+import time
+from asyncio import AbstractEventLoop
+from collections import OrderedDict
+from threading import Lock
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+import ntchat
+
+from ntchat_client.log import logger
+from ntchat_client.model import Request, Response
+
+MIN_REFRESH_INTERVAL = 10
+"""同一群或联系人两次刷新的最小间隔(s)，未缓存或刷新失败时也不会每条事件都触发刷新"""
+
+
+class _Room:
+    """群元数据"""
+
+    __slots__ = ("name", "members", "updated")
+
+    def __init__(self) -> None:
+        self.name: Optional[str] = None
+        """群名"""
+        self.members: Dict[str, Tuple[str, str]] = {}
+        """成员wxid -> (昵称, 群昵称)"""
+        self.updated = 0.0
+        """最近刷新时间，为0则需要刷新"""
+
+
+class MetadataCache:
+    """
+    说明:
+        群名、成员昵称及联系人昵称缓存，用于在事件中补充 `room_name`、`from_nickname`、`from_room_nickname`
+
+        未命中或过期时在事件循环中异步刷新，本次事件不等待刷新，过期的信息刷新完成前继续使用
+
+        记录每个群及联系人最近的刷新时间（包括失败的刷新），间隔不足 `MIN_REFRESH_INTERVAL` 时不再刷新
+
+        刷新经过 `call_api`，共用查询缓存、调用合并及线程池限制
+
+    参数:
+        * `call_api`：api调用函数
+        * `get_loop`：获取事件循环，事件循环未运行时不刷新
+        * `ttl`：缓存刷新间隔(s)
+        * `max_size`：最多缓存的群数及联系人数
+    """
+
+    _rooms: "OrderedDict[str, _Room]"
+    """群id -> 群元数据，按最近使用排列"""
+    _contacts: "OrderedDict[str, Tuple[str, float]]"
+    """wxid -> (昵称, 刷新时间)，按最近使用排列"""
+    _attempts: "OrderedDict[Tuple[str, str], float]"
+    """(类型, id) -> 最近开始刷新的时间，按时间排列"""
+
+    def __init__(
+        self,
+        call_api: Callable[[Request], Awaitable[Response]],
+        get_loop: Callable[[], Optional[AbstractEventLoop]],
+        ttl: float,
+        max_size: int,
+    ) -> None:
+        self._call_api = call_api
+        self._get_loop = get_loop
+        self._ttl = ttl
+        self._max_size = max_size
+        self._rooms = OrderedDict()
+        self._contacts = OrderedDict()
+        self._attempts = OrderedDict()
+        self._pending: Set[Tuple[str, str]] = set()
+        self._lock = Lock()
+        self._hits = 0
+        self._misses = 0
+        self._refreshes = 0
+        self._failed = 0
+        self._throttled = 0
+
+    def enrich(self, data: dict) -> None:
+        """补充事件数据中的名称，缓存中没有的字段不补充"""
+        wxid = data.get("from_wxid")
+        room_wxid = data.get("room_wxid")
+        if not wxid and not room_wxid:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if room_wxid:
+                hit, refresh = self._enrich_room(data, room_wxid, wxid, now)
+                key = ("room", room_wxid)
+            else:
+                hit, refresh = self._enrich_contact(data, wxid, now)
+                key = ("contact", wxid)
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+            if not refresh or key in self._pending:
+                return
+            last = self._attempts.get(key)
+            if last is not None and now - last < MIN_REFRESH_INTERVAL:
+                self._throttled += 1
+                return
+            loop = self._get_loop()
+            if loop is None or not loop.is_running():
+                return
+            self._pending.add(key)
+            self._attempts[key] = now
+            self._attempts.move_to_end(key)
+            # 群及联系人各最多缓存max_size个
+            while len(self._attempts) > self._max_size * 2:
+                self._attempts.popitem(last=False)
+        asyncio.run_coroutine_threadsafe(self._refresh(*key), loop)
+
+    def _enrich_room(
+        self, data: dict, room_wxid: str, wxid: Optional[str], now: float
+    ) -> Tuple[bool, bool]:
+        """补充群消息，返回 (是否命中, 是否需要刷新)，需持有锁"""
+        room = self._rooms.get(room_wxid)
+        if room is None:
+            return False, True
+        self._rooms.move_to_end(room_wxid)
+        refresh = now - room.updated > self._ttl
+        hit = room.name is not None
+        if room.name is not None:
+            data["room_name"] = room.name
+        if wxid:
+            member = room.members.get(wxid)
+            if member is None:
+                hit = False
+                # 新成员，距上次刷新足够久时刷新
+                refresh = refresh or now - room.updated > MIN_REFRESH_INTERVAL
+            else:
+                nickname, room_nickname = member
+                data["from_nickname"] = nickname
+                if room_nickname:
+                    data["from_room_nickname"] = room_nickname
+        return hit, refresh
+
+    def _enrich_contact(self, data: dict, wxid: str, now: float) -> Tuple[bool, bool]:
+        """补充私聊消息，返回 (是否命中, 是否需要刷新)，需持有锁"""
+        contact = self._contacts.get(wxid)
+        if contact is None:
+            return False, True
+        self._contacts.move_to_end(wxid)
+        nickname, updated = contact
+        data["from_nickname"] = nickname
+        return True, now - updated > self._ttl
+
+    def handle_event(self, msgtype: int, data: dict) -> None:
+        """群成员或群名变化时，下一条该群的事件触发刷新"""
+        room_wxid = None
+        if msgtype in (
+            ntchat.MT_ROOM_ADD_MEMBER_NOTIFY_MSG,
+            ntchat.MT_ROOM_DEL_MEMBER_NOTIFY_MSG,
+        ):
+            room_wxid = data.get("room_wxid")
+        elif msgtype == ntchat.MT_RECV_SYSTEM_MSG and "修改群名为" in data.get(
+            "raw_msg", ""
+        ):
+            room_wxid = data.get("room_wxid") or data.get("from_wxid")
+        if room_wxid is None:
+            return
+        with self._lock:
+            room = self._rooms.get(room_wxid)
+            if room is not None:
+                room.updated = 0.0
+                # 群变化后立即允许刷新
+                self._attempts.pop(("room", room_wxid), None)
+
+    async def _refresh(self, kind: str, key: str) -> None:
+        """在事件循环中刷新群或联系人"""
+        try:
+            self._refreshes += 1
+            if kind == "room":
+                await self._refresh_room(key)
+            else:
+                await self._refresh_contact(key)
+        except Exception as e:
+            self._failed += 1
+            logger.error(f"<m>wechat</m> - 刷新{kind}信息出错：<r>{str(e)}</r>")
+        finally:
+            with self._lock:
+                self._pending.discard((kind, key))
+
+    async def _refresh_room(self, room_wxid: str) -> None:
+        """刷新群名及成员"""
+        params = {"room_wxid": room_wxid}
+        members, name = await asyncio.gather(
+            self._call_api(Request("get_room_members", params)),
+            self._call_api(Request("get_room_name", dict(params))),
+        )
+        if members.status != 200 and name.status != 200:
+            raise RuntimeError(members.msg)
+        with self._lock:
+            room = self._rooms.get(room_wxid) or _Room()
+            if members.status == 200:
+                room.members = {
+                    member["wxid"]: (
+                        member.get("nickname") or "",
+                        member.get("display_name") or "",
+                    )
+                    for member in (members.data or {}).get("member_list", [])
+                    if member.get("wxid")
+                }
+            if name.status == 200 and isinstance(name.data, str):
+                room.name = name.data
+            room.updated = time.monotonic()
+            self._rooms[room_wxid] = room
+            self._rooms.move_to_end(room_wxid)
+            while len(self._rooms) > self._max_size:
+                self._rooms.popitem(last=False)
+
+    async def _refresh_contact(self, wxid: str) -> None:
+        """刷新联系人昵称"""
+        response = await self._call_api(Request("get_contact_detail", {"wxid": wxid}))
+        if response.status != 200 or not isinstance(response.data, dict):
+            raise RuntimeError(response.msg)
+        with self._lock:
+            self._contacts[wxid] = (
+                response.data.get("nickname") or "",
+                time.monotonic(),
+            )
+            self._contacts.move_to_end(wxid)
+            while len(self._contacts) > self._max_size:
+                self._contacts.popitem(last=False)
+
+    def stats(self) -> dict:
+        """信息补充统计信息"""
+        return {
+            "rooms": len(self._rooms),
+            "contacts": len(self._contacts),
+            "hits": self._hits,
+            "misses": self._misses,
+            "refreshes": self._refreshes,
+            "failed": self._failed,
+            "throttled": self._throttled,
+            "pending": len(self._pending),
+        }
@@ -0,0 +1,144 @@
+"""
+api调用执行器
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+from typing import Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class CancelToken(Event):
+    """
+    说明:
+        取消标记，调用开始与超时取消互斥，二者只有一个生效
+
+        调用开始后取消不再生效，用于判断超时时ntchat调用是否已经发出
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._state_lock = Lock()
+        self.started = False
+        """调用是否已开始"""
+
+    def begin(self) -> bool:
+        """标记调用开始，已取消时返回False"""
+        with self._state_lock:
+            if self.is_set():
+                return False
+            self.started = True
+            return True
+
+    def cancel(self) -> bool:
+        """取消调用，调用已开始时返回False"""
+        with self._state_lock:
+            if self.started:
+                return False
+            self.set()
+            return True
+
+
+class ApiExecutor:
+    """
+    说明:
+        将阻塞的ntchat调用放入有界线程池执行，支持单接口并发限制及超时取消
+
+    参数:
+        * `max_workers`：线程池大小
+        * `timeout`：默认超时时间(s)，为0则不超时
+        * `action_limits`：单个接口并发上限
+        * `action_timeouts`：单个接口超时时间(s)
+
+        超时时尚未开始调用的请求直接取消，已开始的调用无法中止，由 `wait_started` 决定是否继续等待结果
+    """
+
+    _pool: ThreadPoolExecutor
+    """线程池"""
+    _semaphores: Dict[str, asyncio.Semaphore]
+    """接口并发信号量"""
+
+    def __init__(
+        self,
+        max_workers: int,
+        timeout: float,
+        action_limits: Dict[str, int],
+        action_timeouts: Dict[str, float],
+    ) -> None:
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ntchat_api"
+        )
+        self._timeout = timeout
+        self._action_limits = action_limits
+        self._action_timeouts = action_timeouts
+        self._semaphores = {}
+
+    def _get_semaphore(self, action: str) -> Optional[asyncio.Semaphore]:
+        """获取接口信号量，未限制的接口返回None"""
+        limit = self._action_limits.get(action)
+        if not limit:
+            return None
+        semaphore = self._semaphores.get(action)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(limit)
+            self._semaphores[action] = semaphore
+        return semaphore
+
+    def get_timeout(self, action: str) -> Optional[float]:
+        """获取接口超时时间，为None则不超时"""
+        timeout = self._action_timeouts.get(action, self._timeout)
+        return timeout or None
+
+    async def _submit(
+        self, action: str, func: Callable[[CancelToken], T], cancel: CancelToken
+    ) -> T:
+        """提交到线程池，信号量在线程真正结束后才释放"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._get_semaphore(action)
+        if semaphore is not None:
+            await semaphore.acquire()
+        try:
+            future = self._pool.submit(func, cancel)
+        except Exception:
+            if semaphore is not None:
+                semaphore.release()
+            raise
+        if semaphore is not None:
+            future.add_done_callback(
+                lambda _: loop.call_soon_threadsafe(semaphore.release)
+            )
+        return await asyncio.wrap_future(future)
+
+    async def run(
+        self,
+        action: str,
+        func: Callable[[CancelToken], T],
+        wait_started: bool = False,
+    ) -> T:
+        """
+        说明:
+            在线程池中执行调用，超时将抛出 `asyncio.TimeoutError`
+
+        参数:
+            * `action`：接口名
+            * `func`：调用函数，参数为取消标记，执行中应检查该标记尽早退出，发出调用前应调用 `begin`
+            * `wait_started`：超时时调用已开始则继续等待结果，不抛出超时
+        """
+        cancel = CancelToken()
+        task = asyncio.ensure_future(self._submit(action, func, cancel))
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.get_timeout(action))
+        except asyncio.TimeoutError:
+            if not cancel.cancel() and wait_started:
+                return await task
+            task.cancel()
+            raise
+        except asyncio.CancelledError:
+            cancel.cancel()
+            task.cancel()
+            raise
+
+    def shutdown(self) -> None:
+        """关闭线程池"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
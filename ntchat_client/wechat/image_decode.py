@@ -9,6 +9,10 @@ from ntchat_client.config import Config
 from ntchat_client.log import logger
 
 
+CHUNK_SIZE = 1 << 20
+"""解密时每块的字节数"""
+
+
 @dataclass
 class FileTypes:
     """文件格式"""
@@ -52,6 +56,8 @@ class FileDecoder:
         说明:
             解密微信图片文件，并返回新的文件地址
 
+            输入文件通过内存映射按块读取，每块与密钥异或后写入输出文件，内存占用与文件大小无关
+
         参数:
             * `image_file`：dat文件路径
             * `is_thumb`：是否为缩略图
@@ -59,18 +65,27 @@ class FileDecoder:
         返回:
             * `str`：解密文件路径
         """
-        file_value = np.fromfile(image_file, dtype=np.uint8)
-        file_type = self.get_file_type(file_value[0], file_value[1])
+        with open(image_file, mode="rb") as f:
+            head = f.read(2)
+        if len(head) < 2:
+            return None
+        file_type = self.get_file_type(head[0], head[1])
         if file_type is None:
             return None
-        xor_array = np.full_like(file_value, fill_value=file_type.key)
-        out_value = np.bitwise_xor(file_value, xor_array)
         if is_thumb:
             out_file = self.out_image_thumb / f"{image_file.stem}.{file_type.file_type}"
         else:
             out_file = self.out_image_dir / f"{image_file.stem}.{file_type.file_type}"
+        # 映射在函数返回后释放
+        file_value = np.memmap(image_file, dtype=np.uint8, mode="r")
+        key = np.uint8(file_type.key)
+        buffer = np.empty(min(CHUNK_SIZE, file_value.size), dtype=np.uint8)
         with open(out_file, mode="wb") as f:
-            f.write(out_value)
+            for start in range(0, file_value.size, CHUNK_SIZE):
+                chunk = file_value[start : start + CHUNK_SIZE]
+                out_value = buffer[: chunk.size]
+                np.bitwise_xor(chunk, key, out=out_value)
+                f.write(out_value)
 
         return str(out_file.absolute())
 
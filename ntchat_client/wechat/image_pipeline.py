@@ -0,0 +1,373 @@
+"""
+图片消息异步处理
+"""
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Deque, Dict, FrozenSet, Optional, Set, Tuple
+
+from ntchat_client.log import logger
+
+from .image_decode import FileDecoder
+
+IMAGE_ORDERINGS = ("strict", "best_effort")
+"""图片消息顺序：strict同一会话的消息等待之前的图片消息，best_effort图片解密后立即上报"""
+
+
+def _normalize(path: str) -> str:
+    """统一路径格式，用于匹配文件事件"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+class _Entry:
+    """待上报的消息，图片消息需等待文件下载并解密"""
+
+    __slots__ = (
+        "message",
+        "conversation",
+        "route",
+        "paths",
+        "deadline",
+        "created",
+        "state",
+        "send",
+        "sizes",
+        "sized",
+    )
+
+    def __init__(
+        self,
+        message: dict,
+        conversation: str,
+        route: Optional[FrozenSet[str]] = None,
+        paths: Tuple[str, ...] = (),
+        deadline: float = 0,
+    ) -> None:
+        self.message = message
+        self.conversation = conversation
+        self.route = route
+        """规则指定的上报端，为None则上报到所有上报端"""
+        self.paths = paths
+        """等待的文件，普通消息为空"""
+        self.deadline = deadline
+        self.created = time.monotonic()
+        self.state = "waiting" if paths else "ready"
+        """waiting等待文件、decoding解密中、ready可以上报"""
+        self.send = True
+        """是否上报，超时且不发送超时图片时为False"""
+        self.sizes: Optional[Tuple[int, ...]] = None
+        """最近一次变化后的文件大小"""
+        self.sized = 0.0
+        """文件大小最近一次变化的时间"""
+
+
+class _FileWatcher:
+    """
+    说明:
+        watchdog文件监听，监听图片所在文件夹，文件创建或写入时回调
+
+        未安装watchdog时不可用，由轮询代替
+    """
+
+    def __init__(self, callback: Callable[[str], None]) -> None:
+        self._watched: Set[str] = set()
+        self._observer: Any = None
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event: Any) -> None:
+                callback(event.src_path)
+                dest_path = getattr(event, "dest_path", "")
+                if dest_path:
+                    callback(dest_path)
+
+        self._handler = Handler()
+        self._observer = Observer()
+        self._observer.daemon = True
+        self._observer.start()
+
+    @property
+    def available(self) -> bool:
+        """是否可用"""
+        return self._observer is not None
+
+    def watch(self, directory: str) -> None:
+        """监听文件夹，文件夹不存在时跳过，由轮询兜底"""
+        if directory in self._watched or not os.path.isdir(directory):
+            return
+        try:
+            self._observer.schedule(self._handler, directory, recursive=False)
+        except OSError as e:
+            logger.warning(f"<m>wechat</m> - 监听图片文件夹失败：{str(e)}")
+            return
+        self._watched.add(directory)
+
+    def stop(self) -> None:
+        """停止监听"""
+        if self._observer is not None:
+            self._observer.stop()
+
+
+class ImagePipeline:
+    """
+    说明:
+        图片消息异步处理，等待图片下载及解密不会阻塞其他消息
+
+        文件到达优先通过watchdog监听，未安装watchdog时轮询；解密在线程池中进行
+
+        文件大小保持 `poll_interval` 不变才开始解密，避免解密仍在写入的文件
+
+        `strict` 顺序下，同一会话中图片消息之后的消息会等待图片处理完成后按顺序上报；
+        `best_effort` 顺序下其他消息立即上报，图片消息解密后上报
+
+    参数:
+        * `decoder`：图片解密器
+        * `publish`：上报函数，参数为 (消息, 上报端)
+        * `timeout`：等待图片下载的超时时间(s)
+        * `timeout_send`：超时的图片消息是否继续上报
+        * `workers`：解密线程数
+        * `ordering`：消息顺序，见 `IMAGE_ORDERINGS`
+        * `watch`：是否使用watchdog监听文件
+        * `poll_interval`：轮询间隔(s)
+    """
+
+    _held: Dict[str, Deque[_Entry]]
+    """strict顺序下各会话等待上报的消息"""
+    _paths: Dict[str, Set[_Entry]]
+    """等待中的文件 -> 等待该文件的图片消息"""
+
+    def __init__(
+        self,
+        decoder: FileDecoder,
+        publish: Callable[[dict, Optional[FrozenSet[str]]], None],
+        timeout: float,
+        timeout_send: bool,
+        workers: int,
+        ordering: str = "strict",
+        watch: bool = True,
+        poll_interval: float = 0.2,
+    ) -> None:
+        if ordering not in IMAGE_ORDERINGS:
+            raise ValueError(f"image_ordering应为：{'、'.join(IMAGE_ORDERINGS)}")
+        self._decoder = decoder
+        self._publish = publish
+        self._timeout = timeout
+        self._timeout_send = timeout_send
+        self._strict = ordering == "strict"
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="image_decode"
+        )
+        self._lock = Lock()
+        self._held = {}
+        self._paths = {}
+        self._waiting: Set[_Entry] = set()
+        self._watcher = _FileWatcher(self._on_file) if watch else None
+        # 有watchdog时轮询只用于超时检查及兜底
+        if self._watcher is not None and self._watcher.available:
+            self._interval = 1.0
+        else:
+            self._interval = poll_interval
+        self._poll_interval = poll_interval
+        self._closed = Event()
+        self._wakeup = Event()
+        self._thread = Thread(target=self._run, name="image_poll", daemon=True)
+        self._thread.start()
+        self._decoded = 0
+        self._timeouts = 0
+        self._failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def submit(
+        self,
+        message: dict,
+        conversation: str,
+        route: Optional[FrozenSet[str]] = None,
+    ) -> None:
+        """提交图片消息，图片下载并解密后上报"""
+        data: dict = message["data"]
+        entry = _Entry(
+            message,
+            conversation,
+            route,
+            (_normalize(data["image"]), _normalize(data["image_thumb"])),
+            time.monotonic() + self._timeout,
+        )
+        with self._lock:
+            if self._strict:
+                self._held.setdefault(conversation, deque()).append(entry)
+            self._waiting.add(entry)
+            for path in entry.paths:
+                self._paths.setdefault(path, set()).add(entry)
+        if self._watcher is not None and self._watcher.available:
+            for path in entry.paths:
+                self._watcher.watch(os.path.dirname(path))
+        # 监听前文件可能已经存在
+        self._check(entry)
+
+    def hold(
+        self,
+        message: dict,
+        conversation: str,
+        route: Optional[FrozenSet[str]] = None,
+    ) -> bool:
+        """
+        说明:
+            strict顺序下，会话中有未处理完的图片消息时，将消息排在其后
+
+        返回:
+            * `bool`：是否已排队，为False时应立即上报
+        """
+        if not self._strict:
+            return False
+        with self._lock:
+            held = self._held.get(conversation)
+            if held is None:
+                return False
+            held.append(_Entry(message, conversation, route))
+            return True
+
+    def _on_file(self, path: str) -> None:
+        """文件事件回调"""
+        with self._lock:
+            entries = list(self._paths.get(_normalize(path), ()))
+        for entry in entries:
+            self._check(entry)
+
+    def _check(self, entry: _Entry) -> None:
+        """图片文件都已到达且大小不再变化时开始解密"""
+        try:
+            sizes = tuple(os.path.getsize(path) for path in entry.paths)
+        except OSError:
+            return
+        if 0 in sizes:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if entry.state != "waiting":
+                return
+            if sizes != entry.sizes:
+                # 可能仍在写入，由轮询线程稍后再次检查
+                entry.sizes = sizes
+                entry.sized = now
+                self._wakeup.set()
+                return
+            if now - entry.sized < self._poll_interval:
+                return
+            entry.state = "decoding"
+            self._unwait(entry)
+        try:
+            self._executor.submit(self._decode, entry)
+        except RuntimeError:
+            # 已关闭
+            pass
+
+    def _unwait(self, entry: _Entry) -> None:
+        """移出等待列表，需持有锁"""
+        self._waiting.discard(entry)
+        for path in entry.paths:
+            entries = self._paths.get(path)
+            if entries is not None:
+                entries.discard(entry)
+                if not entries:
+                    del self._paths[path]
+
+    def _decode(self, entry: _Entry) -> None:
+        """在线程池中解密图片并替换字段"""
+        data: dict = entry.message["data"]
+        try:
+            image = self._decoder.decode_file(Path(data["image"]), False)
+            image_thumb = self._decoder.decode_file(Path(data["image_thumb"]), True)
+        except Exception as e:
+            logger.error(f"<m>wechat</m> - 解密图片出错：<r>{str(e)}</r>")
+            self._failed += 1
+            self._finish(entry, self._timeout_send)
+            return
+        data["image"] = image
+        data["image_thumb"] = image_thumb
+        self._decoded += 1
+        logger.debug("<m>wechat</m> - 解密图片已保存...")
+        self._finish(entry, True)
+
+    def _finish(self, entry: _Entry, send: bool) -> None:
+        """图片处理完成，按顺序上报"""
+        wait = time.monotonic() - entry.created
+        self._wait_total += wait
+        self._wait_max = max(self._wait_max, wait)
+        with self._lock:
+            entry.state = "ready"
+            entry.send = send
+            if not self._strict:
+                if send:
+                    self._publish(entry.message, entry.route)
+                return
+            # 在锁内上报，保证同一会话的顺序
+            held = self._held.get(entry.conversation)
+            while held and held[0].state == "ready":
+                ready = held.popleft()
+                if ready.send:
+                    self._publish(ready.message, ready.route)
+            if held is not None and not held:
+                del self._held[entry.conversation]
+
+    def _run(self) -> None:
+        """轮询文件及超时"""
+        while not self._closed.is_set():
+            if self._wakeup.wait(self._interval):
+                # 有文件大小变化，间隔轮询间隔后确认大小是否稳定
+                self._wakeup.clear()
+                self._closed.wait(self._poll_interval)
+            if self._closed.is_set():
+                return
+            now = time.monotonic()
+            with self._lock:
+                waiting = list(self._waiting)
+            for entry in waiting:
+                self._check(entry)
+                if entry.deadline > now:
+                    continue
+                with self._lock:
+                    if entry.state != "waiting":
+                        continue
+                    entry.state = "decoding"
+                    self._unwait(entry)
+                self._timeouts += 1
+                if self._timeout_send:
+                    logger.debug("<m>wechat</m> - 下载图片超时，本次消息原样发送...")
+                else:
+                    logger.error("<m>wechat</m> - 下载图片超时，本次消息不会发送...")
+                self._finish(entry, self._timeout_send)
+
+    def stats(self) -> dict:
+        """图片处理统计信息"""
+        finished = self._decoded + self._timeouts + self._failed
+        with self._lock:
+            waiting = len(self._waiting)
+            held = sum(len(entries) for entries in self._held.values())
+        return {
+            "watcher": "watchdog"
+            if self._watcher is not None and self._watcher.available
+            else "polling",
+            "waiting": waiting,
+            "held": held,
+            "decoded": self._decoded,
+            "timeouts": self._timeouts,
+            "failed": self._failed,
+            "avg_wait_ms": self._wait_total / (finished or 1) * 1000,
+            "max_wait_ms": self._wait_max * 1000,
+        }
+
+    def close(self) -> None:
+        """停止处理，未完成的图片消息不再上报"""
+        self._closed.set()
+        self._wakeup.set()
+        if self._watcher is not None:
+            self._watcher.stop()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,102 @@
+"""
+列表接口分页
+"""
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+PAGEABLE_ACTIONS = {"get_contacts", "get_rooms", "get_room_members", "get_publics"}
+"""支持分页的接口"""
+
+PAGE_PARAMS = ("offset", "limit", "cursor", "stream")
+"""分页参数，调用ntchat前会被移除"""
+
+ITEM_KEYS = ("member_list",)
+"""结果为dict时，列表所在的字段"""
+
+
+@dataclass
+class Page:
+    """分页参数"""
+
+    offset: int = 0
+    """起始位置"""
+    limit: Optional[int] = None
+    """每页条数，为None则返回全部"""
+    cursor: Optional[str] = None
+    """上一页最后一项的wxid，设置后忽略offset"""
+    stream: bool = False
+    """是否以ndjson流式返回，仅http可用"""
+
+    @classmethod
+    def from_params(
+        cls, params: Optional[dict]
+    ) -> Tuple[Optional["Page"], Optional[dict]]:
+        """
+        说明:
+            从请求参数中取出分页参数，参数不正确时抛出 `ValueError`
+
+        返回:
+            * `Page`：分页参数，未分页时为None
+            * `dict`：移除分页参数后的请求参数
+        """
+        if not params or not any(key in params for key in PAGE_PARAMS):
+            return None, params
+        params = dict(params)
+        offset = params.pop("offset", 0) or 0
+        limit = params.pop("limit", None)
+        cursor = params.pop("cursor", None)
+        stream = bool(params.pop("stream", False))
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError("offset应为非负整数")
+        if limit is not None and (not isinstance(limit, int) or limit <= 0):
+            raise ValueError("limit应为正整数")
+        if cursor is not None and not isinstance(cursor, str):
+            raise ValueError("cursor应为str")
+        return cls(offset, limit, cursor, stream), params or None
+
+
+def split_items(data: Any) -> Tuple[List[Any], Optional[str]]:
+    """取出结果中的列表，返回 (列表, 所在字段)"""
+    if isinstance(data, list):
+        return data, None
+    if isinstance(data, dict):
+        for key in ITEM_KEYS:
+            items = data.get(key)
+            if isinstance(items, list):
+                return items, key
+    raise ValueError("返回结果不是列表")
+
+
+def paginate(data: Any, page: Page) -> dict:
+    """
+    说明:
+        对列表结果分页，只切片引用，不拷贝列表项
+
+    返回:
+        * `dict`：`items`、`total`、`offset`、`next_offset`、`next_cursor`，
+        结果为dict时保留其余字段
+    """
+    items, key = split_items(data)
+    start = page.offset
+    if page.cursor is not None:
+        for index, item in enumerate(items):
+            if isinstance(item, dict) and item.get("wxid") == page.cursor:
+                start = index + 1
+                break
+        else:
+            raise ValueError("cursor不存在")
+    total = len(items)
+    end = total if page.limit is None else min(start + page.limit, total)
+    chunk = items[start:end]
+    has_next = end < total
+    result = {k: v for k, v in data.items() if k != key} if key else {}
+    result.update(
+        items=chunk,
+        total=total,
+        offset=start,
+        next_offset=end if has_next else None,
+        next_cursor=chunk[-1].get("wxid")
+        if has_next and chunk and isinstance(chunk[-1], dict)
+        else None,
+    )
+    return result
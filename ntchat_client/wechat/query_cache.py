@@ -0,0 +1,148 @@
+"""
+查询结果缓存
+"""
+import json
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional, Set, Tuple
+
+CacheKey = Tuple[str, str]
+"""缓存键：(接口名, 规范化参数)"""
+
+
+def make_key(action: str, params: Optional[dict]) -> CacheKey:
+    """根据接口名和参数生成缓存键，参数顺序不影响结果"""
+    if not params:
+        return action, ""
+    return action, json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+
+class QueryCache:
+    """
+    说明:
+        联系人及群查询结果缓存，带过期时间、容量上限及LRU淘汰
+
+    参数:
+        * `ttls`：各接口缓存时间(s)，不在其中的接口不会缓存
+        * `max_size`：最大缓存条数
+    """
+
+    _entries: "OrderedDict[CacheKey, Tuple[float, Any]]"
+    """缓存内容：键 -> (过期时间, 值)"""
+    _action_keys: Dict[str, Set[CacheKey]]
+    """接口名 -> 缓存键"""
+    _generation: int
+    """失效计数，用于丢弃失效前发起的查询结果"""
+
+    def __init__(self, ttls: Dict[str, float], max_size: int) -> None:
+        self._ttls = {action: ttl for action, ttl in ttls.items() if ttl > 0}
+        self._max_size = max_size
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self._action_keys = {}
+        self._generation = 0
+        self._hits: Dict[str, int] = {}
+        self._misses: Dict[str, int] = {}
+        self._evictions = 0
+        self._invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        """当前失效计数"""
+        return self._generation
+
+    def cacheable(self, action: str) -> bool:
+        """接口是否可缓存"""
+        return self._max_size > 0 and action in self._ttls
+
+    def get(self, key: CacheKey) -> Tuple[bool, Any]:
+        """获取缓存，返回 (是否命中, 值)"""
+        action = key[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits[action] = self._hits.get(action, 0) + 1
+                    return True, entry[1]
+                self._remove(key)
+            self._misses[action] = self._misses.get(action, 0) + 1
+        return False, None
+
+    def set(self, key: CacheKey, value: Any, generation: int) -> None:
+        """
+        说明:
+            写入缓存
+
+        参数:
+            * `key`：缓存键
+            * `value`：缓存值
+            * `generation`：发起查询时的失效计数，期间有失效则不写入
+        """
+        action = key[0]
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self._ttls[action], value)
+            self._entries.move_to_end(key)
+            self._action_keys.setdefault(action, set()).add(key)
+            while len(self._entries) > self._max_size:
+                old_key, _ = self._entries.popitem(last=False)
+                self._action_keys[old_key[0]].discard(old_key)
+                self._evictions += 1
+
+    def _remove(self, key: CacheKey) -> None:
+        """删除缓存，需持有锁"""
+        if self._entries.pop(key, None) is not None:
+            self._action_keys[key[0]].discard(key)
+
+    def invalidate(self, action: str, params: Optional[dict] = None) -> None:
+        """
+        说明:
+            使缓存失效
+
+        参数:
+            * `action`：接口名
+            * `params`：调用参数，为None时失效该接口全部缓存
+        """
+        if not self.cacheable(action):
+            return
+        with self._lock:
+            self._generation += 1
+            self._invalidations += 1
+            if params is None:
+                for key in self._action_keys.pop(action, set()):
+                    self._entries.pop(key, None)
+            else:
+                self._remove(make_key(action, params))
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._action_keys.clear()
+
+    def stats(self) -> dict:
+        """缓存统计信息"""
+        with self._lock:
+            hits = sum(self._hits.values())
+            misses = sum(self._misses.values())
+            return {
+                "size": len(self._entries),
+                "max_size": self._max_size,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "actions": {
+                    action: {
+                        "hits": self._hits.get(action, 0),
+                        "misses": self._misses.get(action, 0),
+                        "size": len(self._action_keys.get(action, ())),
+                    }
+                    for action in self._ttls
+                },
+            }
@@ -0,0 +1,156 @@
+"""
+事件规则
+"""
+import re
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Pattern
+
+from pydantic import parse_obj_as
+
+from ntchat_client.codec import loads
+from ntchat_client.config import EventRule
+
+RULE_ACTIONS = ("drop", "accept", "route")
+"""规则动作"""
+
+
+def load_rules_file(path: str) -> List[EventRule]:
+    """从json文件读取规则列表"""
+    return parse_obj_as(List[EventRule], loads(Path(path).read_bytes()))
+
+
+class _CompiledRule:
+    """编译后的规则"""
+
+    __slots__ = (
+        "name",
+        "action",
+        "msg_types",
+        "senders",
+        "self_sent",
+        "pattern",
+        "regex",
+        "sinks",
+        "hits",
+    )
+
+    def __init__(self, index: int, rule: EventRule) -> None:
+        if rule.action not in RULE_ACTIONS:
+            raise ValueError(f"事件规则动作应为：{'、'.join(RULE_ACTIONS)}")
+        if rule.action == "route" and not rule.sinks:
+            raise ValueError("route规则需要填写sinks")
+        self.name = rule.name or f"rule{index}"
+        self.action = rule.action
+        # 空条件为None，匹配时直接跳过
+        self.msg_types = frozenset(rule.msg_types) or None
+        self.senders = frozenset(rule.senders) or None
+        self.self_sent = rule.self_sent
+        self.pattern: Optional[Pattern] = (
+            re.compile("|".join(re.escape(keyword) for keyword in rule.keywords))
+            if rule.keywords
+            else None
+        )
+        # 正则单独编译，允许使用(?i)等内联标记
+        self.regex: Optional[Pattern] = None
+        if rule.regex:
+            try:
+                self.regex = re.compile(rule.regex)
+            except re.error as e:
+                raise ValueError(f"事件规则{self.name}的regex不正确：{str(e)}")
+        self.sinks: FrozenSet[str] = frozenset(rule.sinks)
+        self.hits = 0
+
+    def matches(self, msgtype: int, data: dict, self_sent: bool) -> bool:
+        """除群外的条件是否都满足，群已在索引中匹配"""
+        if self.msg_types is not None and msgtype not in self.msg_types:
+            return False
+        if self.senders is not None and data.get("from_wxid") not in self.senders:
+            return False
+        if self.self_sent is not None and self.self_sent != self_sent:
+            return False
+        if self.pattern is None and self.regex is None:
+            return True
+        content = data.get("msg") or data.get("raw_msg")
+        if not isinstance(content, str):
+            return False
+        if self.pattern is not None and self.pattern.search(content) is not None:
+            return True
+        return self.regex is not None and self.regex.search(content) is not None
+
+
+class EventRules:
+    """
+    说明:
+        事件规则匹配，启动时编译，按顺序匹配第一条命中的规则
+
+        规则按群建立索引，事件只需检查对应群的规则及不限群的规则，大群的无关事件几乎没有开销
+
+        关键词合并为一个正则，regex单独编译，命中任意一个即满足
+
+        匹配在回调线程中进行一次，route规则的上报端随事件传递到上报
+
+    参数:
+        * `rules`：规则列表
+    """
+
+    _generic: List[_CompiledRule]
+    """不限群的规则"""
+    _by_room: Dict[str, List[_CompiledRule]]
+    """群id -> 该群需要检查的规则，已与不限群的规则按顺序合并"""
+
+    def __init__(self, rules: List[EventRule]) -> None:
+        self._rules = [_CompiledRule(index, rule) for index, rule in enumerate(rules)]
+        self._generic = []
+        self._by_room = {}
+        rooms = set()
+        for rule in rules:
+            rooms |= rule.rooms
+        for room in rooms:
+            self._by_room[room] = []
+        for compiled, rule in zip(self._rules, rules):
+            if not rule.rooms:
+                self._generic.append(compiled)
+                for candidates in self._by_room.values():
+                    candidates.append(compiled)
+            else:
+                for room in rule.rooms:
+                    self._by_room[room].append(compiled)
+        self._evaluated = 0
+        self._dropped = 0
+
+    def __bool__(self) -> bool:
+        return bool(self._rules)
+
+    def match(
+        self, msgtype: int, data: dict, self_sent: bool
+    ) -> Optional[_CompiledRule]:
+        """
+        说明:
+            匹配事件，返回第一条命中的规则
+
+        参数:
+            * `msgtype`：事件类型
+            * `data`：事件数据
+            * `self_sent`：是否为自身发送
+        """
+        room = data.get("room_wxid")
+        candidates = self._by_room.get(room, self._generic) if room else self._generic
+        self._evaluated += 1
+        for rule in candidates:
+            if rule.matches(msgtype, data, self_sent):
+                rule.hits += 1
+                if rule.action == "drop":
+                    self._dropped += 1
+                return rule
+        return None
+
+    def stats(self) -> dict:
+        """规则统计信息"""
+        return {
+            "evaluated": self._evaluated,
+            "dropped": self._dropped,
+            "rules": [
+                {"name": rule.name, "action": rule.action, "hits": rule.hits}
+                for rule in self._rules
+            ],
+        }
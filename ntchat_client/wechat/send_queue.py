@@ -0,0 +1,304 @@
+"""
+发送队列
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, List, Optional, Set, Tuple
+from uuid import uuid4
+
+from ntchat_client.model import Response
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+"""优先级通道，数字越小越先发送"""
+
+SEND_PARAMS = ("priority", "nowait")
+"""发送队列参数，调用ntchat前会被移除"""
+
+
+def pop_send_params(params: Optional[dict]) -> Tuple[int, bool, Optional[dict]]:
+    """
+    说明:
+        从请求参数中取出发送队列参数，参数不正确时抛出 `ValueError`
+
+    返回:
+        * `int`：优先级
+        * `bool`：是否不等待发送结果
+        * `dict`：移除队列参数后的请求参数
+    """
+    if not params or not any(key in params for key in SEND_PARAMS):
+        return PRIORITIES["normal"], False, params
+    params = dict(params)
+    priority = params.pop("priority", "normal")
+    nowait = bool(params.pop("nowait", False))
+    if isinstance(priority, str):
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority应为：{'、'.join(PRIORITIES)}")
+        priority = PRIORITIES[priority]
+    elif not isinstance(priority, int) or priority not in PRIORITIES.values():
+        raise ValueError("priority不正确")
+    return priority, nowait, params or None
+
+
+class TokenBucket:
+    """令牌桶"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: int, now: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """获取一个令牌需要等待的时间"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float) -> None:
+        """消耗一个令牌"""
+        self._refill(now)
+        self.tokens -= 1
+
+    def full(self, now: float) -> bool:
+        """令牌是否已满"""
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class SendJob:
+    """发送任务"""
+
+    __slots__ = (
+        "job_id",
+        "action",
+        "conversation",
+        "priority",
+        "call",
+        "future",
+        "status",
+        "created",
+        "finished",
+    )
+
+    def __init__(
+        self,
+        action: str,
+        conversation: str,
+        priority: int,
+        call: Callable[[], Awaitable[Response]],
+    ) -> None:
+        self.job_id = uuid4().hex
+        self.action = action
+        self.conversation = conversation
+        self.priority = priority
+        self.call = call
+        self.future: "asyncio.Future[Response]" = (
+            asyncio.get_running_loop().create_future()
+        )
+        self.status = "queued"
+        self.created = time.time()
+        self.finished: Optional[float] = None
+
+    def dict(self) -> dict:
+        """任务信息"""
+        result = self.future.result().dict() if self.future.done() else None
+        return {
+            "job_id": self.job_id,
+            "action": self.action,
+            "conversation": self.conversation,
+            "status": self.status,
+            "result": result,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+class SendQueue:
+    """
+    说明:
+        发送队列，按账号及会话令牌桶限速，优先级高的通道先发送，同一会话按顺序发送
+
+    参数:
+        * `rate`：账号每秒发送条数
+        * `burst`：账号突发条数
+        * `conversation_rate`：单个会话每秒发送条数
+        * `conversation_burst`：单个会话突发条数
+        * `max_size`：队列最大长度
+        * `job_ttl`：任务结果保留时间(s)
+    """
+
+    _lanes: List[Deque[SendJob]]
+    """优先级通道"""
+    _buckets: "OrderedDict[str, TokenBucket]"
+    """会话令牌桶"""
+    _jobs: "OrderedDict[str, SendJob]"
+    """任务记录"""
+    _finished: "OrderedDict[str, SendJob]"
+    """已完成的任务，按完成时间排列，单独清理，不受未完成的任务影响"""
+    _running: Set[str]
+    """正在发送的会话"""
+
+    max_buckets: int = 10000
+    """最多保留的会话令牌桶"""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        conversation_rate: float,
+        conversation_burst: int,
+        max_size: int,
+        job_ttl: float,
+    ) -> None:
+        now = time.monotonic()
+        self._account = TokenBucket(rate, burst, now)
+        self._conversation_rate = conversation_rate
+        self._conversation_burst = conversation_burst
+        self._max_size = max_size
+        self._job_ttl = job_ttl
+        self._lanes = [deque() for _ in PRIORITIES]
+        self._buckets = OrderedDict()
+        self._jobs = OrderedDict()
+        self._finished = OrderedDict()
+        self._running = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sent = 0
+        self._rejected = 0
+
+    @property
+    def size(self) -> int:
+        """排队中的任务数"""
+        return sum(len(lane) for lane in self._lanes)
+
+    def submit(
+        self,
+        action: str,
+        conversation: str,
+        priority: int,
+        call: Callable[[], Awaitable[Response]],
+    ) -> Optional[SendJob]:
+        """提交发送任务，队列已满时返回None"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        if self.size >= self._max_size:
+            self._rejected += 1
+            return None
+        job = SendJob(action, conversation, priority, call)
+        self._lanes[priority].append(job)
+        self._jobs[job.job_id] = job
+        self._trim_jobs()
+        self._wakeup.set()
+        return job
+
+    def get_job(self, job_id: str) -> dict:
+        """查询任务"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise ValueError("任务不存在或已过期")
+        return job.dict()
+
+    def stats(self) -> dict:
+        """队列统计信息"""
+        return {
+            "queued": {name: len(self._lanes[no]) for name, no in PRIORITIES.items()},
+            "running": len(self._running),
+            "sent": self._sent,
+            "rejected": self._rejected,
+            "jobs": len(self._jobs),
+        }
+
+    def _trim_jobs(self) -> None:
+        """清理过期的任务记录，未完成的任务不会清理"""
+        deadline = time.time() - self._job_ttl
+        while self._finished:
+            job = next(iter(self._finished.values()))
+            if job.finished > deadline and len(self._finished) <= self._max_size * 2:
+                break
+            self._finished.popitem(last=False)
+            self._jobs.pop(job.job_id, None)
+
+    def _get_bucket(self, conversation: str, now: float) -> TokenBucket:
+        """获取会话令牌桶"""
+        bucket = self._buckets.get(conversation)
+        if bucket is None:
+            bucket = TokenBucket(
+                self._conversation_rate, self._conversation_burst, now
+            )
+            self._buckets[conversation] = bucket
+            if len(self._buckets) > self.max_buckets:
+                old_bucket = next(iter(self._buckets.values()))
+                if old_bucket.full(now):
+                    self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(conversation)
+        return bucket
+
+    def _pick(self, now: float) -> Tuple[Optional[SendJob], Optional[float]]:
+        """选出下一个可发送的任务，没有时返回需要等待的时间"""
+        wait = self._account.wait_time(now)
+        if wait > 0:
+            return None, wait
+        min_wait: Optional[float] = None
+        blocked: Set[str] = set(self._running)
+        for lane in self._lanes:
+            for job in lane:
+                if job.conversation in blocked:
+                    continue
+                conversation_wait = self._get_bucket(job.conversation, now).wait_time(
+                    now
+                )
+                if conversation_wait == 0:
+                    lane.remove(job)
+                    return job, None
+                blocked.add(job.conversation)
+                if min_wait is None or conversation_wait < min_wait:
+                    min_wait = conversation_wait
+        return None, min_wait
+
+    async def _run(self) -> None:
+        """调度循环"""
+        while True:
+            now = time.monotonic()
+            job, wait = self._pick(now)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._account.consume(now)
+            self._get_bucket(job.conversation, now).consume(now)
+            self._running.add(job.conversation)
+            job.status = "running"
+            asyncio.create_task(self._execute(job))
+
+    async def _execute(self, job: SendJob) -> None:
+        """执行发送"""
+        try:
+            response = await job.call()
+        except Exception as e:
+            response = Response(status=500, msg=f"发送出错：{str(e)}", data={})
+        job.status = "done"
+        job.finished = time.time()
+        self._finished[job.job_id] = job
+        self._trim_jobs()
+        job.future.set_result(response)
+        self._sent += 1
+        self._running.discard(job.conversation)
+        self._wakeup.set()
+
+    def close(self) -> None:
+        """关闭队列"""
+        if self._task is not None:
+            self._task.cancel()
@@ -0,0 +1,56 @@
+"""
+相同调用合并
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """
+    说明:
+        合并并发的相同调用，同一时刻相同键只会执行一次，结果分发给所有调用方
+
+        调用在独立的task中执行，单个调用方取消不会影响其他调用方
+    """
+
+    _calls: Dict[Hashable, "asyncio.Task[T]"]
+    """进行中的调用"""
+
+    def __init__(self) -> None:
+        self._calls = {}
+        self._executed = 0
+        self._shared = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        说明:
+            执行调用，已有相同键的调用进行中时等待其结果
+
+        参数:
+            * `key`：调用键
+            * `call`：调用函数
+        """
+        task = self._calls.get(key)
+        if task is None:
+            self._executed += 1
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._remove(key, done))
+        else:
+            self._shared += 1
+        return await asyncio.shield(task)
+
+    def _remove(self, key: Hashable, task: "asyncio.Task[T]") -> None:
+        """调用结束后移除"""
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        """合并统计信息"""
+        return {
+            "in_flight": len(self._calls),
+            "executed": self._executed,
+            "shared": self._shared,
+        }
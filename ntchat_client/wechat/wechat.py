@@ -1,14 +1,18 @@
 import asyncio
-import time
 from asyncio import AbstractEventLoop
-from pathlib import Path
-from typing import Any, Callable, NoReturn, Optional
+from functools import partial
+from threading import Event
+from threading import Lock
+from threading import Thread
+from typing import Any, Callable, Dict, FrozenSet, List, NoReturn, Optional
 
 import ntchat
 
+from ntchat_client.codec import dumps
 from ntchat_client.config import Config
-from ntchat_client.log import logger
+from ntchat_client.log import Payload, logger
 from ntchat_client.model import (
+    BatchRequest,
     HttpRequest,
     HttpResponse,
     Request,
@@ -16,11 +20,24 @@ from ntchat_client.model import (
     WsRequest,
     WsResponse,
 )
-from ntchat_client.utils import escape_tag, notify
+from ntchat_client.utils import notify
 
 from .cache import FileCache
+from .dedup import EventDeduplicator
+from .delivery import PRIORITY_LOW, PRIORITY_NORMAL, Accept, DeliveryQueue, Sink
+from .directory import ContactDirectory
+from .dispatch import FILE_PARAMS, ActionRegistry, ActionSpec
+from .dispatcher import EventDispatcher
+from .enrich import MetadataCache
+from .executor import ApiExecutor, CancelToken
 from .image_decode import FileDecoder
+from .image_pipeline import ImagePipeline
+from .pagination import Page, paginate
 from .qrcode import draw_qrcode
+from .query_cache import QueryCache, make_key
+from .rules import EventRules, load_rules_file
+from .send_queue import SEND_PARAMS, SendQueue, pop_send_params
+from .singleflight import SingleFlight
 import os
 import signal
 
@@ -53,10 +70,23 @@ def wechat_shutdown() -> None:
     """关闭微信模块"""
     if wechat_client:
         logger.info("<m>wechat</m> - 正在关闭微信注入...")
+        wechat_client.api_executor.shutdown()
+        if wechat_client.send_queue is not None:
+            wechat_client.send_queue.close()
+        if wechat_client.dispatcher is not None:
+            wechat_client.dispatcher.close()
+        wechat_client.image_pipeline.close()
+        for delivery in wechat_client.deliveries.values():
+            delivery.close()
         ntchat.exit_()
         logger.success("<m>wechat</m> - <g>微信注入已关闭...</g>")
 
 
+def get_conversation(data: dict) -> str:
+    """获取事件所属会话：群消息为群id，其他为发送者id"""
+    return data.get("room_wxid") or data.get("from_wxid") or ""
+
+
 class WeChatManager:
     """微信封装类"""
 
@@ -70,14 +100,36 @@ class WeChatManager:
     """事件循环"""
     ws_message_handler: Callable[..., Any] = None
     """ws消息处理器"""
-    http_post_handler: Callable[..., Any] = None
-    """http_post处理器"""
+    sinks: Dict[str, Sink]
+    """其他上报端：名称 -> 上报端"""
     file_cache: FileCache
     """文件缓存管理器"""
     image_decoder: FileDecoder
     """图片解密器"""
-    image_timeout: int
-    """图片下载超时时间"""
+    image_pipeline: ImagePipeline
+    """图片消息异步处理"""
+    api_executor: ApiExecutor
+    """api调用执行器"""
+    query_cache: QueryCache
+    """联系人及群查询缓存"""
+    actions: ActionRegistry
+    """接口调度表"""
+    send_queue: Optional[SendQueue] = None
+    """发送队列，未启用时为None"""
+    single_flight: Optional[SingleFlight[Response]] = None
+    """相同调用合并，未启用时为None"""
+    deliveries: Dict[str, DeliveryQueue]
+    """各上报端的投递队列"""
+    event_rules: EventRules
+    """事件规则"""
+    deduplicator: Optional[EventDeduplicator] = None
+    """事件去重，未启用时为None"""
+    directory: Optional[ContactDirectory] = None
+    """联系人及群目录，未启用时为None"""
+    metadata: Optional[MetadataCache] = None
+    """事件信息补充缓存，未启用时为None"""
+    dispatcher: Optional[EventDispatcher] = None
+    """按会话分片的事件分发，未启用时在回调线程中处理"""
     msg_fiter = {
         ntchat.MT_USER_LOGIN_MSG,
         ntchat.MT_USER_LOGOUT_MSG,
@@ -98,7 +150,77 @@ class WeChatManager:
         self.config = config
         self.file_cache = FileCache(config.cache_path)
         self.image_decoder = FileDecoder(config.image_path)
-        self.image_timeout = config.image_timeout
+        self.image_pipeline = ImagePipeline(
+            self.image_decoder,
+            self._publish,
+            timeout=config.image_timeout,
+            timeout_send=config.timeout_image_send,
+            workers=config.image_workers,
+            ordering=config.image_ordering,
+            watch=config.image_watch,
+            poll_interval=config.image_poll_interval,
+        )
+        self.api_executor = ApiExecutor(
+            max_workers=config.api_workers,
+            timeout=config.api_timeout,
+            action_limits=config.api_action_limits,
+            action_timeouts=config.api_action_timeouts,
+        )
+        self.query_cache = QueryCache(config.query_cache_ttl, config.query_cache_size)
+        self.actions = ActionRegistry()
+        self.actions.register_local("get_cache_stats", self.query_cache.stats)
+        if config.api_coalesce:
+            self.single_flight = SingleFlight()
+            self.actions.register_local(
+                "get_coalesce_stats", self.single_flight.stats
+            )
+        if config.send_queue:
+            self.send_queue = SendQueue(
+                rate=config.send_rate,
+                burst=config.send_burst,
+                conversation_rate=config.send_conversation_rate,
+                conversation_burst=config.send_conversation_burst,
+                max_size=config.send_queue_size,
+                job_ttl=config.send_job_ttl,
+            )
+            self.actions.register_local("get_send_job", self.send_queue.get_job)
+            self.actions.register_local(
+                "get_send_queue_stats", self.send_queue.stats
+            )
+        self.sinks = {}
+        self.deliveries = {}
+        self._deliveries_lock = Lock()
+        self.actions.register_local("get_delivery_stats", self.delivery_stats)
+        self.actions.register_local("get_image_stats", self.image_pipeline.stats)
+        rules = list(config.event_rules)
+        if config.event_rules_file:
+            rules += load_rules_file(config.event_rules_file)
+        self.event_rules = EventRules(rules)
+        self.actions.register_local("get_rule_stats", self.event_rules.stats)
+        if config.directory:
+            self.directory = ContactDirectory()
+            self.actions.register_local("search_directory", self.directory.search)
+            self.actions.register_local(
+                "get_directory_stats", self.directory.stats
+            )
+        if config.enrich:
+            self.metadata = MetadataCache(
+                self.call_api,
+                lambda: self.loop,
+                ttl=config.enrich_ttl,
+                max_size=config.enrich_size,
+            )
+            self.actions.register_local("get_enrich_stats", self.metadata.stats)
+        if config.dedup:
+            self.deduplicator = EventDeduplicator(config.dedup_window, config.dedup_size)
+            self.actions.register_local("get_dedup_stats", self.deduplicator.stats)
+        if config.dispatch_shards > 0:
+            self.dispatcher = EventDispatcher(
+                self._handle_message,
+                shards=config.dispatch_shards,
+                max_size=config.dispatch_queue_size,
+            )
+            self.actions.register_local("get_dispatch_stats", self.dispatcher.stats)
         self.msg_fiter |= config.msg_filter
         ntchat.set_wechat_exe_path(wechat_version="3.6.0.18")
 
@@ -119,10 +241,27 @@ class WeChatManager:
         notify.acquire()
         logger.success("<m>wechat</m> - <g>hook微信成功！</g>")
         self.self_id = message["data"]["wxid"]
+        self.actions.load_wechat(
+            self.wechat,
+            {
+                action: partial(self._pre_handle_file, key)
+                for action, key in FILE_PARAMS.items()
+            },
+        )
         self.wechat.on(ntchat.MT_ALL, self.on_message)
+        if self.directory is not None:
+            Thread(target=self._load_directory, name="directory", daemon=True).start()
         notify.notify_all()
         notify.release()
 
+    def _load_directory(self) -> None:
+        """加载联系人及群目录"""
+        logger.info("<m>wechat</m> - 正在加载联系人目录...")
+        try:
+            self.directory.load(self.wechat.get_contacts(), self.wechat.get_rooms())
+        except Exception as e:
+            logger.error(f"<m>wechat</m> - 加载联系人目录出错：<r>{str(e)}</r>")
+
     def logout(self, _: ntchat.WeChat, message: dict) -> None:
         """
         登出hook
@@ -154,124 +293,337 @@ class WeChatManager:
         logger.info("<m>wechat</m> - 检测到登录二维码...")
         draw_qrcode(url)
 
-    def _pre_handle_api(self, action: str, params: Optional[dict] = None) -> dict:
+    def _pre_handle_file(
+        self, key: str, params: dict, cancel: Optional[Event] = None
+    ) -> dict:
         """
         参数预处理，用于缓存文件操作
         """
-        if params is None:
-            return
-
-        if action == "send_image" or action == "send_file" or action == "send_video":
-            file: str = params.get("file_path")
-            params["file_path"] = self.file_cache.handle_file(
-                file, self.config.cache_path
-            )
-        elif action == "send_gif":
-            file: str = params.get("file")
-            params["file"] = self.file_cache.handle_file(
-                file, self.config.cache_path
-            )
+        file: str = params.get(key)
+        params[key] = self.file_cache.handle_file(file, self.config.cache_path, cancel)
         return params
 
-    def _handle_api(self, request: Request) -> Response:
+    def _handle_api(
+        self,
+        spec: ActionSpec,
+        params: Optional[dict],
+        cancel: Optional[CancelToken] = None,
+    ) -> Response:
         """处理api调用"""
+        if spec.pre_handle is not None and params is not None:
+            try:
+                params = spec.pre_handle(params, cancel)
+            except Exception as e:
+                logger.error(f"<m>wechat</m> - 处理参数出错：{str(e)}...")
+                return Response(status=500, msg=f"处理参数出错：{str(e)}", data={})
+        if cancel is not None and not cancel.begin():
+            # 已超时，不再调用
+            return Response(status=504, msg="调用超时", data={})
+
         try:
-            params = self._pre_handle_api(request.action, request.params)
+            logger.debug(
+                "<m>wechat</m> - <g>调用接口：</g>{}，参数：{}", spec.name, Payload(params)
+            )
+            if params is None:
+                result = spec.func()
+            else:
+                result = spec.func(**params)
+            return spec.shape(result)
         except Exception as e:
-            logger.error(f"<m>wechat</m> - 处理参数出错：{str(e)}...")
-            return Response(status=500, msg=f"处理参数出错：{str(e)}", data={})
+            return Response(status=405, msg=f"调用出错{str(e)}", data={})
 
-        attr = getattr(self.wechat, request.action, None)
-        if not attr:
+    async def call_api(self, request: Request) -> Response:
+        """在线程池中处理api调用，不阻塞事件循环"""
+        spec = self.actions.get(request.action)
+        if spec is None:
             # 返回方法不存在错误
             logger.error(f"<m>wechat</m> - 接口不存在：{request.action}")
             return Response(status=404, msg="请求接口不存在！", data={})
-        else:
+        params = request.params
+        page = None
+        try:
+            if spec.pageable:
+                page, params = Page.from_params(params)
+            if spec.sendable and self.send_queue is not None:
+                priority, nowait, params = pop_send_params(params)
+            elif spec.sendable and any(key in (params or ()) for key in SEND_PARAMS):
+                # 未开启发送队列时不能忽略nowait，否则调用方会被意外阻塞
+                raise ValueError(f"未开启send_queue，不支持{'、'.join(SEND_PARAMS)}参数")
+            spec.bind(params)
+        except (TypeError, ValueError) as e:
+            return Response(status=405, msg=f"请求参数不正确：{str(e)}", data={})
+        if spec.local:
+            return self._handle_api(spec, params)
+        if spec.sendable and self.send_queue is not None:
+            return await self._call_queued(spec, params, priority, nowait)
+
+        response = await self._call_cached(spec, params)
+        if page is not None and response.status == 200:
             try:
-                logger.debug(
-                    f"<m>wechat</m> - <g>调用接口：</g>{request.action}，参数：{params}"
-                )
-                if params is None:
-                    result = attr()
-                else:
-                    result = attr(**params)
-                if (
-                    isinstance(result, bool)
-                    or isinstance(result, dict)
-                    or isinstance(result, list)
-                    or isinstance(result, str)
-                ):
-                    response = Response(status=200, msg="调用成功", data=result)
-                else:
-                    response = Response(status=204, msg="调用成功，但没有返回结果", data={})
-            except Exception as e:
-                response = Response(status=405, msg=f"调用出错{str(e)}", data={})
+                data = paginate(response.data, page)
+            except ValueError as e:
+                return Response(status=405, msg=f"分页出错：{str(e)}", data={})
+            response = Response(status=200, msg=response.msg, data=data)
         return response
 
-    def handle_http_api(self, request: HttpRequest) -> HttpResponse:
+    async def _call_queued(
+        self, spec: ActionSpec, params: Optional[dict], priority: int, nowait: bool
+    ) -> Response:
+        """经过发送队列调用，nowait时立即返回任务id"""
+        conversation = ""
+        if params:
+            conversation = params.get("to_wxid") or params.get("room_wxid") or ""
+        job = self.send_queue.submit(
+            spec.name, conversation, priority, partial(self._call_executor, spec, params)
+        )
+        if job is None:
+            return Response(status=429, msg="发送队列已满", data={})
+        if nowait:
+            return Response(status=202, msg="已加入发送队列", data={"job_id": job.job_id})
+        return await asyncio.shield(job.future)
+
+    async def _call_cached(self, spec: ActionSpec, params: Optional[dict]) -> Response:
+        """查询缓存，未命中时调用"""
+        cacheable = self.query_cache.cacheable(spec.name)
+        if not cacheable:
+            return await self._call_shared(spec, params)
+
+        key = make_key(spec.name, params)
+        hit, response = self.query_cache.get(key)
+        if hit:
+            return response
+        generation = self.query_cache.generation
+        response = await self._call_shared(spec, params)
+        if response.status == 200:
+            self.query_cache.set(key, response, generation)
+        return response
+
+    async def _call_shared(self, spec: ActionSpec, params: Optional[dict]) -> Response:
+        """只读调用合并相同的并发请求"""
+        if self.single_flight is None or not spec.read_only:
+            return await self._call_executor(spec, params)
+        return await self.single_flight.do(
+            make_key(spec.name, params), partial(self._call_executor, spec, params)
+        )
+
+    async def _call_executor(self, spec: ActionSpec, params: Optional[dict]) -> Response:
+        """在线程池中调用，非只读接口已发出调用后超时仍等待结果，避免调用方重试导致重复发送"""
+        try:
+            return await self.api_executor.run(
+                spec.name,
+                partial(self._handle_api, spec, params),
+                wait_started=not spec.read_only,
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"<m>wechat</m> - 调用接口超时：{spec.name}")
+            return Response(status=504, msg="调用超时", data={})
+
+    def _invalidate_cache(self, msgtype: int, data: dict) -> None:
+        """根据事件使相关查询缓存失效"""
+        if msgtype in (
+            ntchat.MT_ROOM_ADD_MEMBER_NOTIFY_MSG,
+            ntchat.MT_ROOM_DEL_MEMBER_NOTIFY_MSG,
+        ):
+            room_wxid = data.get("room_wxid")
+            self.query_cache.invalidate("get_room_members", {"room_wxid": room_wxid})
+            self.query_cache.invalidate("get_rooms")
+        elif msgtype == ntchat.MT_ROOM_CREATE_NOTIFY_MSG:
+            self.query_cache.invalidate("get_rooms")
+        elif msgtype in (
+            ntchat.MT_CONTACT_ADD_NOITFY_MSG,
+            ntchat.MT_CONTACT_DEL_NOTIFY_MSG,
+        ):
+            wxid = data.get("wxid")
+            self.query_cache.invalidate("get_contact_detail", {"wxid": wxid})
+            self.query_cache.invalidate("get_contacts")
+        elif msgtype == ntchat.MT_RECV_SYSTEM_MSG:
+            raw_msg: str = data.get("raw_msg", "")
+            if "修改群名为" in raw_msg:
+                room_wxid = data.get("room_wxid") or data.get("from_wxid")
+                self.query_cache.invalidate("get_room_name", {"room_wxid": room_wxid})
+                self.query_cache.invalidate("get_rooms")
+
+    async def handle_batch(self, batch: BatchRequest) -> Response:
+        """
+        说明:
+            批量处理api调用，按顺序返回每个调用的结果
+
+        参数:
+            * `batch`：批量请求，`parallel` 为真时相邻的只读调用将并行执行
+        """
+        items = batch.items
+        results: List[Optional[Response]] = [None] * len(items)
+        index = 0
+        failed = False
+        while index < len(items) and not failed:
+            end = index + 1
+            if batch.parallel and self.actions.is_read_only(items[index].action):
+                while end < len(items) and self.actions.is_read_only(items[end].action):
+                    end += 1
+            group = await asyncio.gather(
+                *(self.call_api(item) for item in items[index:end])
+            )
+            results[index:end] = group
+            failed = batch.stop_on_error and any(one.status >= 400 for one in group)
+            index = end
+
+        data = []
+        for result in results:
+            if result is None:
+                result = Response(status=424, msg="前置调用出错，未执行", data={})
+            data.append(result.dict())
+        return Response(status=200, msg="调用成功", data=data)
+
+    async def handle_http_api(self, request: HttpRequest) -> HttpResponse:
         """处理http的api调用"""
-        request = Request(action=request.action, params=request.params)
-        response = self._handle_api(request)
+        response = await self.call_api(request)
         return HttpResponse(
             status=response.status, msg=response.msg, data=response.data
         )
 
-    def handle_ws_api(self, request: WsRequest) -> WsRequest:
+    async def handle_http_batch(self, batch: BatchRequest) -> HttpResponse:
+        """处理http的批量api调用"""
+        response = await self.handle_batch(batch)
+        return HttpResponse(
+            status=response.status, msg=response.msg, data=response.data
+        )
+
+    async def handle_ws_api(self, request: WsRequest) -> WsResponse:
         """处理ws的api调用"""
         echo = request.echo
-        request = Request(action=request.action, params=request.params)
-        response = self._handle_api(request)
+        if request.action == "batch":
+            try:
+                batch = BatchRequest.parse_obj(request.params or {})
+            except ValueError:
+                return WsResponse(echo=echo, status=405, msg="请求参数不正确！", data={})
+            response = await self.handle_batch(batch)
+        else:
+            response = await self.call_api(request)
         return WsResponse(
             echo=echo, status=response.status, msg=response.msg, data=response.data
         )
 
-    def _handle_image(self, message: dict) -> Optional[dict]:
-        """处理图片消息，并替换字段，如果超时将会返回None"""
-        data: dict = message["data"]
-        image_file = Path(data["image"])
-        image_thumb = Path(data["image_thumb"])
-        time_count = 0
-        while True:
-            if image_file.exists() and image_thumb.exists():
-                break
-            time_count += 1
-            if time_count > self.image_timeout:
-                return None
-            time.sleep(1)
-        data["image"] = self.image_decoder.decode_file(image_file, False)
-        data["image_thumb"] = self.image_decoder.decode_file(image_thumb, True)
-        return message
-
     def on_message(self, _: ntchat.WeChat, message: dict) -> None:
-        """接收消息"""
-        # 过滤事件
+        """接收消息，过滤后按会话分发"""
         msgtype = message["type"]
+        data: dict = message["data"]
+        # 更新缓存，需在过滤前处理
+        self._invalidate_cache(msgtype, data)
+        if self.directory is not None:
+            self.directory.handle_event(msgtype, data)
+        if self.metadata is not None:
+            self.metadata.handle_event(msgtype, data)
+        # 过滤事件
         if msgtype in self.msg_fiter:
             return
-        wx_id = message["data"].get("from_wxid")
-        if wx_id == self.self_id and not self.config.report_self:
+        self_sent = data.get("from_wxid") == self.self_id
+        if self_sent and not self.config.report_self:
             return
-        logger.success(f"<m>wechat</m> - <g>收到wechat消息：</g>{escape_tag(str(message))}")
-        if msgtype == 11047:
-            # 群图片消息，预处理
-            logger.debug("正在解密图片地址...")
-            message = self._handle_image(message)
-            if message is None:
-                if self.config.timeout_image_send:
-                    logger.debug("下载图片超时，本次消息原样发送...")
-                else:
-                    logger.error("下载图片超时，本次消息不会发送...")
-                    return
-            else:
-                logger.debug("解密图片已保存...")
+        # 在日志及序列化前匹配规则，route规则的上报端随事件传递
+        route = None
+        if self.event_rules:
+            rule = self.event_rules.match(msgtype, data, self_sent)
+            if rule is not None and rule.action == "drop":
+                return
+            if rule is not None and rule.action == "route":
+                route = rule.sinks
+        if self.deduplicator is not None and self.deduplicator.seen(message):
+            logger.debug("<m>wechat</m> - 收到重复事件，已忽略...")
+            return
+        conversation = get_conversation(data)
+        if self.dispatcher is None:
+            self._handle_message(conversation, message, route)
+        else:
+            self.dispatcher.dispatch(conversation, message, route)
+
+    def _handle_message(
+        self,
+        conversation: str,
+        message: dict,
+        route: Optional[FrozenSet[str]] = None,
+    ) -> None:
+        """处理消息，同一会话的消息按顺序调用"""
+        if self.metadata is not None:
+            # 只使用缓存，未命中时后台刷新
+            self.metadata.enrich(message["data"])
+        logger.success("<m>wechat</m> - <g>收到wechat消息：</g>{}", Payload(message))
+        if message["type"] == 11047:
+            # 群图片消息，下载并解密后上报，不阻塞其他消息
+            logger.debug("<m>wechat</m> - 正在等待图片下载...")
+            self.image_pipeline.submit(message, conversation, route)
+            return
+        if self.image_pipeline.hold(message, conversation, route):
+            return
+        self._publish(message, route)
 
-        if self.loop is not None:
-            if self.loop.is_running:
-                if self.ws_message_handler:
-                    asyncio.run_coroutine_threadsafe(
-                        self.ws_message_handler(message), self.loop
-                    )
-                if self.http_post_handler:
-                    asyncio.run_coroutine_threadsafe(
-                        self.http_post_handler(message), self.loop
+    def _publish(self, message: dict, route: Optional[FrozenSet[str]] = None) -> None:
+        """将消息投递到各上报端，`route` 为None则投递到所有上报端"""
+        if self.loop is None or not self.loop.is_running():
+            return
+        msgtype = message["type"]
+        data: dict = message["data"]
+        # 只序列化一次，各上报端共用
+        body = dumps(message)
+        priority = (
+            PRIORITY_LOW
+            if msgtype in self.config.delivery_low_priority
+            else PRIORITY_NORMAL
+        )
+        if self.ws_message_handler and (route is None or "ws" in route):
+            self._deliver("ws", self.ws_message_handler, body, priority)
+        for name, sink in list(self.sinks.items()):
+            if route is not None and name not in route:
+                continue
+            if sink.accept is None or sink.accept(msgtype, data):
+                self._deliver(name, sink.handler, body, priority, sink.concurrency)
+
+    def register_sink(
+        self,
+        name: str,
+        handler: Callable[..., Any],
+        accept: Optional[Accept] = None,
+        concurrency: Optional[int] = None,
+    ) -> None:
+        """
+        说明:
+            注册上报端，每个上报端有独立的投递队列，慢的上报端不会影响其他上报端
+
+        参数:
+            * `name`：上报端名称
+            * `handler`：上报函数，参数为已序列化的事件
+            * `accept`：事件过滤函数，参数为 (事件类型, 事件数据)，为None则上报所有事件
+            * `concurrency`：同时上报数，为None则使用 `delivery_concurrency`
+        """
+        self.sinks[name] = Sink(handler, accept, concurrency)
+
+    def _deliver(
+        self,
+        name: str,
+        handler: Callable[..., Any],
+        body: bytes,
+        priority: int,
+        concurrency: Optional[int] = None,
+    ) -> None:
+        """将事件放入上报端的投递队列"""
+        delivery = self.deliveries.get(name)
+        if delivery is None:
+            with self._deliveries_lock:
+                delivery = self.deliveries.get(name)
+                if delivery is None:
+                    delivery = DeliveryQueue(
+                        name,
+                        handler,
+                        self.loop,
+                        max_size=self.config.delivery_queue_size,
+                        policy=self.config.delivery_policy,
+                        block_timeout=self.config.delivery_block_timeout,
+                        concurrency=concurrency or self.config.delivery_concurrency,
                     )
+                    self.deliveries[name] = delivery
+        delivery.handler = handler
+        if not delivery.put(body, priority):
+            logger.warning(f"<m>wechat</m> - {name}投递队列已满，丢弃事件...")
+
+    def delivery_stats(self) -> dict:
+        """各上报端投递统计信息"""
+        return {name: delivery.stats() for name, delivery in self.deliveries.items()}